@@ -1,36 +1,52 @@
 # app.py — Triageo (Demo-mode guaranteed cards)
 
-import os, re, requests, threading, time
-from pathlib import Path
+import itertools, os, re, requests, threading
 from dotenv import load_dotenv
+
+# ============ ENV ============
+load_dotenv()  # before any project import: modules read their settings at import time
+
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
-from slack_sdk.web import WebClient
-
-# ---- Local modules (used when DEMO_MODE=false) ----
-try:
-    from triage import parse_log, baseline_severity, summarize
-    from rag import search, build_index
-    from llm import triage_with_llm
-    from blockkit import triage_blocks
-except Exception:
-    # OK in demo mode; we’ll build cards manually.
-    parse_log = baseline_severity = summarize = search = build_index = triage_with_llm = triage_blocks = None
+from dedup import fingerprint, parsed_category, parsed_fingerprint
+from formats import detect_format
+from images import CATALOG
+from metrics import FALLBACKS
+from tailer import TAIL_PATHS, LogTailer
+
+# ---- Shared warm pipeline (its AI stages are used when DEMO_MODE=false) ----
+from pipeline import get_pipeline
+from triage import baseline_severity
+from detect import SlidingWindowDetector
 
-# ============ ENV ============
-load_dotenv()
 BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
 APP_TOKEN = os.getenv("SLACK_APP_TOKEN")
 DEFAULT_CHANNEL = os.getenv("SLACK_CHANNEL_ID")  # optional (for realtime tail)
 DEMO_MODE = (os.getenv("DEMO_MODE", "true").lower() == "true")
+MAX_DOWNLOAD_BYTES = int(os.getenv("MAX_DOWNLOAD_BYTES", str(512 * 1024 * 1024)))
+DEMO_MAX_LINES = int(os.getenv("DEMO_MAX_LINES", "5000"))  # lines of an upload read for a demo-mode card
 
 if not BOT_TOKEN:
     raise SystemExit("Missing SLACK_BOT_TOKEN in .env")
 if not APP_TOKEN:
     raise SystemExit("Missing SLACK_APP_TOKEN in .env")
 
-app = App(token=BOT_TOKEN)
-client = WebClient(token=BOT_TOKEN)
+pipeline = get_pipeline()
+client, delivery, dedup = pipeline.client, pipeline.delivery, pipeline.dedup
+def _bolt_app() -> App:
+    """Bolt app on the pipeline's pooled client.
+
+    Bolt falls back to SLACK_BOT_TOKEN when ``token`` is None and then warns that
+    the client's token wins, so the variable is hidden while the app is built.
+    """
+    token = os.environ.pop("SLACK_BOT_TOKEN", None)
+    try:
+        return App(token=None, client=client)
+    finally:
+        if token is not None:
+            os.environ["SLACK_BOT_TOKEN"] = token
+
+app = _bolt_app()
 
 # ============ Simple heuristics for demo ============
 IP_RE = re.compile(r"(\d{1,3}\.){3}\d{1,3}")
@@ -75,50 +91,128 @@ def demo_blocks(text: str):
     ]
 
 # ============ Card builder ============
-def build_blocks_from_text(text: str):
-    if DEMO_MODE or not all([parse_log, baseline_severity, summarize, search, build_index, triage_with_llm, triage_blocks]):
-        return demo_blocks(text)
+def _pipeline_ready() -> bool:
+    return not DEMO_MODE and pipeline.ai_ready
+
+def build_card_from_text(text: str):
+    """(blocks to post now, future of the LLM card or None); see TriagePipeline.first_card."""
+    if not _pipeline_ready():
+        return demo_blocks(text), None
 
     # Real pipeline
     try:
-        build_index()
-        parsed = parse_log(text)
-        base = baseline_severity(parsed)
-        summary = summarize(parsed)
-        ev = [d["text"] for d in search(summary, k=3)]
-        result = triage_with_llm(summary=summary, baseline=base, evidence_snippets=ev)
-        blocks = triage_blocks(result)
-        if not blocks:
-            raise ValueError("triage_blocks returned empty")
-        return blocks
+        parsed = pipeline.parse(text)
+        return pipeline.first_card(parsed, pipeline.start_triage(parsed))
+    except Exception as e:
+        print("⚠️ AI pipeline failed, falling back to demo:", repr(e))
+        FALLBACKS.inc(kind="demo_blocks")
+        return demo_blocks(text), None
+
+def build_card_from_lines(lines):
+    """Like build_card_from_text, but parses an iterable of str/bytes lines as it streams.
+
+    Demo mode reads only the first DEMO_MAX_LINES lines, then closes ``lines`` (ending a download).
+    """
+    if not _pipeline_ready():
+        head = itertools.islice(lines, DEMO_MAX_LINES)
+        text = "\n".join(ln.decode("utf-8", "replace") if isinstance(ln, bytes) else ln for ln in head)
+        if hasattr(lines, "close"):
+            lines.close()
+        return demo_blocks(text), None
+
+    parsed = pipeline.parse_lines(lines)  # download/stream failures propagate to the caller
+    try:
+        return pipeline.first_card(parsed, pipeline.start_triage(parsed))
     except Exception as e:
         print("⚠️ AI pipeline failed, falling back to demo:", repr(e))
-        return demo_blocks(text)
+        FALLBACKS.inc(kind="demo_blocks")
+        return demo_blocks("\n".join(parsed["samples"])), None
 
-def post_card(channel_id: str, blocks):
+def iter_download(url: str, max_bytes: int = MAX_DOWNLOAD_BYTES):
+    """Yield the lines of a Slack private file as bytes, stopping after max_bytes."""
+    headers = {"Authorization": f"Bearer {BOT_TOKEN}"}
+    with requests.get(url, headers=headers, timeout=20, stream=True) as r:
+        r.raise_for_status()
+        seen = 0
+        for line in r.iter_lines(chunk_size=64 * 1024):
+            seen += len(line) + 1
+            if seen > max_bytes:
+                print(f"✂️ Download capped at {max_bytes} bytes: {url}")
+                return
+            yield line
+
+def attach_image(channel_id: str, thread_ts: str) -> None:
     try:
-        resp = client.chat_postMessage(channel=channel_id, text="🔔 Triageo alert", blocks=blocks)
-        thread_ts = resp.get("ts")
-        # Optional: attach an image thread if you have pick_random_image()
-        try:
-            from images import pick_random_image
-            img = pick_random_image()
-            if img and thread_ts:
-                client.files_upload_v2(
-                    channel=channel_id,
-                    file=img,
-                    filename=os.path.basename(img),
-                    initial_comment="🎲 Random asset attached",
-                    thread_ts=thread_ts,
-                )
-        except Exception as e:
-            print("Image attach failed:", repr(e))
+        CATALOG.attach(delivery, channel_id, thread_ts)
     except Exception as e:
-        print("chat_postMessage failed:", repr(e))
+        print("Image attach failed:", repr(e))
+
+def post_card(channel_id: str, blocks, priority: str = "high", fp: str | None = None, incident: dict | None = None):
+    """Queue a card (plus optional image thread) and return the future of its post.
+
+    Goes through the paced delivery queue without waiting on it; ``priority`` is a
+    severity name. ``fp`` and ``incident`` are passed on to TriagePipeline.post_async.
+    """
+    posted = pipeline.post_async(channel_id, blocks, priority, fp, incident)
+    posted.add_done_callback(lambda f: _card_done(channel_id, priority, f))
+    return posted
+
+def _card_done(channel_id: str, priority: str, f) -> None:
+    if f.exception() is not None:
+        print("chat_postMessage failed:", repr(f.exception()))
+        delivery.submit("chat_postMessage", priority, channel=channel_id, text="⚠️ Could not render triage card.")
+        return
+    thread_ts = f.result().get("ts")
+    # Image reply in the card's thread, off the critical path; each asset is uploaded once.
+    if thread_ts:
         try:
-            client.chat_postMessage(channel=channel_id, text="⚠️ Could not render triage card.")
-        except Exception as ee:
-            print("Fallback text post failed:", repr(ee))
+            pipeline.stages.submit(attach_image, channel_id, thread_ts)
+        except RuntimeError as e:  # shutting down
+            print("Image attach skipped:", repr(e))
+
+def post_triage(channel_id: str, blocks, later=None):
+    """post_card, then swap in the LLM card once ``later`` resolves."""
+    pipeline.follow_up(channel_id, post_card(channel_id, blocks), later)
+
+def post_deduped(channel_id: str, text: str, rule: str | None = None):
+    """post_card for machine-generated alerts: repeats within a window update the existing card.
+
+    Repeats of an acknowledged incident are dropped; repeats of an escalated one are escalated.
+    """
+    if _pipeline_ready():
+        parsed = pipeline.parse(text)
+        severity = baseline_severity(parsed)
+        ip, category = parsed.get("top_ip"), parsed_category(parsed)
+        fp = parsed_fingerprint(parsed, severity, rule)
+        render = lambda: pipeline.first_card(parsed, pipeline.start_triage(parsed))
+    else:
+        d = quick_detect(text)
+        severity, category = d["severity"], d["category"]
+        ip = d["evidence"][0] if d["evidence"] else None
+        fp = fingerprint(category, severity, ip, rule)
+        render = lambda: (demo_blocks(text), None)
+    if not dedup.claim(channel_id, fp):
+        return
+    verdict, note = pipeline.screen(fp, ip)
+    if verdict == "suppress":
+        dedup.release(channel_id, fp)
+        return
+    try:
+        try:
+            blocks, later = render()
+        except Exception as e:
+            print("⚠️ AI pipeline failed, falling back to demo:", repr(e))
+            FALLBACKS.inc(kind="demo_blocks")
+            blocks, later = demo_blocks(text), None
+        blocks, later = pipeline.flag(blocks, later, note)
+        incident = {"ip": ip, "category": category, "severity": severity, "rule": rule,
+                    "status": "escalated" if note else "open"}
+        # The dedup window and incident are filled in once the post lands (or released if it fails).
+        posted = post_card(channel_id, blocks, "critical" if note else severity, fp, incident)
+        pipeline.follow_up(channel_id, posted, later, fp)
+    except Exception:
+        dedup.release(channel_id, fp)
+        raise
 
 # ============ Slack events ============
 @app.event("app_mention")
@@ -138,17 +232,13 @@ def on_mention(body, say, logger):
         if files:
             f = files[0]
             url = f.get("url_private_download")
-            headers = {"Authorization": f"Bearer {BOT_TOKEN}"}
-            r = requests.get(url, headers=headers, timeout=20)
-            r.raise_for_status()
-            content = r.text
-            post_card(channel_id, build_blocks_from_text(content)); return
+            post_triage(channel_id, *build_card_from_lines(iter_download(url))); return
 
         # 2) inline after "log"
         lower = text.lower()
         payload = text.split("log", 1)[-1].strip() if "log" in lower else text
         if payload:
-            post_card(channel_id, build_blocks_from_text(payload)); return
+            post_triage(channel_id, *build_card_from_text(payload)); return
 
         # 3) nudge
         post_card(channel_id, demo_blocks("Send `@Triageo log <lines>` or upload a file."))
@@ -156,45 +246,73 @@ def on_mention(body, say, logger):
     except Exception as e:
         logger.exception(e)
         try:
-            client.chat_postMessage(channel=channel_id, text="⚠️ Could not build the triage card (exception logged).")
+            delivery.submit("chat_postMessage", "high", channel=channel_id, text="⚠️ Could not build the triage card (exception logged).")
         except Exception as ee:
             print("Final nudge failed:", repr(ee))
 
+# ============ Card buttons ============
+BUTTON_REPLIES = {"escalate": "🚨 Escalated by {user}.", "ack": "👀 Acknowledged by {user}.", "lower": "⬇️ Severity lowered by {user}."}
+
+def record_action(body, action: str):
+    """Store the click against the card's incident and confirm it in the card's thread."""
+    channel_id = body["channel"]["id"]
+    ts = (body.get("message") or {}).get("ts") or (body.get("container") or {}).get("message_ts")
+    user = (body.get("user") or {}).get("id")
+    if pipeline.incidents is not None and ts:
+        pipeline.incidents.act(channel_id, ts, action, user)
+    delivery.submit("chat_postMessage", "high" if action == "escalate" else "low", channel=channel_id, thread_ts=ts,
+                    text=BUTTON_REPLIES[action].format(user=f"<@{user}>" if user else "someone"))
+
 @app.action("btn_escalate")
-def on_escalate(ack, body, client, logger):
-    ack(); client.chat_postMessage(channel=body["channel"]["id"], text="🚨 Escalation noted (demo).")
+def on_escalate(ack, body):
+    ack(); record_action(body, "escalate")
 
 @app.action("btn_ack")
-def on_ack(ack, body, client):
-    ack(); client.chat_postMessage(channel=body["channel"]["id"], text="👀 Acknowledged (demo).")
+def on_ack(ack, body):
+    ack(); record_action(body, "ack")
 
 @app.action("btn_lower")
-def on_lower(ack, body, client):
-    ack(); client.chat_postMessage(channel=body["channel"]["id"], text="⬇️ Severity lowered (demo).")
+def on_lower(ack, body):
+    ack(); record_action(body, "lower")
 
 # ============ Realtime tail (optional) ============
-LOG_FILE = "samples/auth_burst.log"
-def tail_log(path):
-    P = Path(path); P.parent.mkdir(parents=True, exist_ok=True); P.touch(exist_ok=True)
-    with open(path, "r") as f:
-        f.seek(0, 2)
-        while True:
-            line = f.readline()
-            if not line: time.sleep(0.5); continue
-            yield line.strip()
-
 def start_realtime():
     if not DEFAULT_CHANNEL:
         print("⏭️ Realtime disabled (set SLACK_CHANNEL_ID to enable)."); return
-    print(f"📡 Tailing {LOG_FILE} → {DEFAULT_CHANNEL}")
-    for line in tail_log(LOG_FILE):
-        try:
-            post_card(DEFAULT_CHANNEL, build_blocks_from_text(line))
-        except Exception as e:
-            print("Realtime failed:", repr(e))
+    print(f"📡 Tailing {TAIL_PATHS} → {DEFAULT_CHANNEL}")
+    detector = SlidingWindowDetector()
+    formats = {}  # path -> format sniffed from its first batch
+
+    def on_lines(path, lines):
+        if path not in formats:
+            formats[path] = detect_format(lines)
+        for line in lines:
+            try:
+                # Per line this is a scan plus a few counter bumps; triage only runs when a rate rule fires.
+                for trig in detector.feed(line, fmt=formats[path]):
+                    print(f"🚩 {trig.rule.name} fired for {trig.key} in {path} ({trig.count} hits / {trig.rule.window_s:.0f}s)")
+                    job = lambda text=trig.text, rule=trig.rule.name: post_deduped(DEFAULT_CHANNEL, text, rule)
+                    if not pipeline.submit(job):  # triage and posting run on the job workers, never in the tail thread
+                        print(f"⚠️ Triage queue full, dropping {trig.rule.name} alert for {trig.key}")
+            except Exception as e:
+                print("Realtime failed:", repr(e))
+
+    LogTailer(TAIL_PATHS).run(on_lines)
 
-threading.Thread(target=start_realtime, daemon=True).start()
+_realtime: threading.Thread | None = None
+
+def start_background():
+    """Start the shared pipeline's workers and the realtime tail; importing app.py starts nothing."""
+    global _realtime
+    pipeline.start()
+    if _realtime is None:
+        _realtime = threading.Thread(target=start_realtime, name="realtime", daemon=True)
+        _realtime.start()
+
+def run_slack():
+    start_background()
+    SocketModeHandler(app, APP_TOKEN).start()
 
 # ============ Entrypoint ============
 if __name__ == "__main__":
-    SocketModeHandler(app, APP_TOKEN).start()
+    run_slack()
@@ -0,0 +1,166 @@
+# bench/fakes.py — local stand-ins for the Slack Web API and Cohere chat/embed
+import hashlib, json, random, re, threading, time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+_IP_RE = re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b")
+_SUMMARY_RE = re.compile(r"LOG SUMMARY\n(.*?)\n\nBASELINE SEVERITY: (\w+)", re.S)
+
+@dataclass
+class Faults:
+    """Injected behaviour: latency is ``latency_s`` ± ``jitter_s``; rates are per-request probabilities."""
+    latency_s: float = 0.0
+    jitter_s: float = 0.0
+    error_rate: float = 0.0
+    rate_429: float = 0.0
+    retry_after_s: int = 1
+
+class _FakeServer:
+    """ThreadingHTTPServer on 127.0.0.1 (random port) with fault injection and per-path counters."""
+
+    exempt: tuple = ()  # paths that never get faults injected
+
+    def __init__(self, faults: Faults | None = None, seed: int = 1):
+        self.faults = faults or Faults()
+        self.rng = random.Random(seed)
+        self.calls: Dict[str, int] = {}
+        self.injected = {"errors": 0, "429": 0}
+        self.lock = threading.Lock()
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *a):
+                pass
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                status, body, headers = outer._serve(self.path, raw, self.headers)
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_port
+
+    def start(self) -> "_FakeServer":
+        threading.Thread(target=self.httpd.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+
+    def _serve(self, path: str, raw: bytes, headers):
+        f = self.faults
+        with self.lock:
+            self.calls[path] = self.calls.get(path, 0) + 1
+            delay = max(0.0, f.latency_s + self.rng.uniform(-f.jitter_s, f.jitter_s))
+            r = 1.0 if path.endswith(self.exempt) else self.rng.random()
+        if delay:
+            time.sleep(delay)
+        if r < f.rate_429:
+            with self.lock:
+                self.injected["429"] += 1
+            return 429, self.rate_limited(), {"Retry-After": str(f.retry_after_s)}
+        if r < f.rate_429 + f.error_rate:
+            with self.lock:
+                self.injected["errors"] += 1
+            return 500, {"ok": False, "error": "internal_error", "message": "injected failure"}, {}
+        return self.handle(path, raw, headers)
+
+    def rate_limited(self) -> dict:
+        return {"ok": False, "error": "ratelimited"}
+
+    def handle(self, path: str, raw: bytes, headers):
+        raise NotImplementedError
+
+class FakeSlack(_FakeServer):
+    """Slack Web API at ``url`` (use as SLACK_API_URL).
+
+    Records when a card first mentioning each IP was posted (``first_card``) and
+    when its final version, i.e. one without the "LLM triage pending" note,
+    landed via postMessage or chat.update (``final_card``).
+    """
+
+    exempt = ("auth.test",)  # startup check; failing it only aborts the run
+
+    def __init__(self, faults: Faults | None = None, seed: int = 1):
+        super().__init__(faults, seed)
+        self.url = f"http://127.0.0.1:{self.port}/api/"
+        self.first_card: Dict[str, float] = {}
+        self.final_card: Dict[str, float] = {}
+        self._ts = 0
+
+    def handle(self, path: str, raw: bytes, headers):
+        method = path.rsplit("/", 1)[-1]
+        ctype = headers.get("Content-Type", "")
+        body = json.loads(raw or b"{}") if "json" in ctype else {}
+        if method == "auth.test":
+            return 200, {"ok": True, "user_id": "UFAKEBOT", "bot_id": "BFAKE", "team_id": "TFAKE", "url": "https://fake.slack/"}, {}
+        if method in ("chat.postMessage", "chat.update"):
+            now = time.monotonic()
+            blob = json.dumps(body.get("blocks") or body.get("text") or "")
+            final = "LLM triage pending" not in blob
+            with self.lock:
+                for ip in set(_IP_RE.findall(blob)):
+                    if method == "chat.postMessage":
+                        self.first_card.setdefault(ip, now)
+                    if final:
+                        self.final_card.setdefault(ip, now)
+                self._ts += 1
+                ts = body.get("ts") or f"{int(time.time())}.{self._ts:06d}"
+            return 200, {"ok": True, "channel": body.get("channel", "C0"), "ts": ts}, {}
+        if method == "files.getUploadURLExternal":
+            return 200, {"ok": True, "file_id": "FFAKE", "upload_url": self.url + "upload"}, {}
+        if method.startswith("files."):
+            return 200, {"ok": True, "files": [{"id": "FFAKE", "title": "asset"}], "file": {"id": "FFAKE"}}, {}
+        return 200, {"ok": True}, {}
+
+class FakeCohere(_FakeServer):
+    """Cohere v1 ``/chat`` and ``/embed`` at ``url`` (use as COHERE_BASE_URL).
+
+    Embeddings are deterministic hashes of the text; chat returns a valid
+    TriageResult JSON that echoes the prompt's log summary.
+    """
+
+    def __init__(self, faults: Faults | None = None, seed: int = 1, dim: int = 256):
+        super().__init__(faults, seed)
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.dim = dim
+
+    def rate_limited(self) -> dict:
+        return {"message": "You are using a Trial key, which is limited to 10 API calls / minute."}
+
+    def _vector(self, text: str) -> List[float]:
+        rng = random.Random(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest())
+        return [rng.uniform(-1, 1) for _ in range(self.dim)]
+
+    def handle(self, path: str, raw: bytes, headers):
+        body = json.loads(raw or b"{}")
+        if path.endswith("/embed"):
+            texts = body.get("texts") or []
+            return 200, {"id": "fake", "response_type": "embeddings_floats", "texts": texts,
+                         "embeddings": [self._vector(t) for t in texts], "meta": {}}, {}
+        if path.endswith("/chat"):
+            m = _SUMMARY_RE.search(body.get("message", ""))
+            summary, baseline = (m.group(1), m.group(2)) if m else ("unknown", "medium")
+            result = {
+                "severity": baseline if baseline in ("low", "medium", "high", "critical") else "medium",
+                "category": "auth" if "failed_logins" in summary else "other",
+                "summary": f"Fake LLM triage: {summary}",
+                "recommended_actions": ["Block the source IP", "Review auth logs", "Enable MFA"],
+                "needs_human_review": True,
+                "confidence": 0.8,
+                "evidence": [summary],
+            }
+            return 200, {"text": json.dumps(result), "generation_id": "fake", "response_id": "fake",
+                         "finish_reason": "COMPLETE", "chat_history": [], "meta": {}}, {}
+        return 404, {"message": "not found"}, {}
@@ -0,0 +1,270 @@
+# bench/loadtest.py — end-to-end load test against local fake Slack and Cohere servers
+#
+#   python -m bench.loadtest --target http --rate 50 --duration 30
+#   python -m bench.loadtest --target mention --rate 10 --duration 20 --cohere-latency 2 --cohere-429-rate 0.05
+#   python -m bench.loadtest --target http --replay events.ndjson --rate 200
+#
+# "http" runs server.py under uvicorn in a subprocess and POSTs /ingest/siem;
+# "mention" imports app.py in-process and calls the app_mention handler.
+# Events are open-loop at --rate. Each event carries its own source IP, so a
+# card can be matched to the event that caused it. Time to card is measured
+# from send to the first chat.postMessage naming that IP (first card) and to
+# the card version without the "pending" note (final card).
+import argparse, json, logging, os, re, socket, subprocess, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import requests
+
+from bench.fakes import Faults, FakeCohere, FakeSlack
+from bench.synth import generate, parse_mix
+
+ROOT = Path(__file__).resolve().parent.parent
+_IP_RE = re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b")
+
+def percentile(values: List[float], p: float) -> float | None:
+    if not values:
+        return None
+    s = sorted(values)
+    return s[min(len(s) - 1, max(0, round(p / 100 * len(s) + 0.5) - 1))]
+
+def slope(points: List[Tuple[float, float]]) -> float:
+    """Least-squares slope of (t, y) points."""
+    if len(points) < 2:
+        return 0.0
+    n = len(points)
+    mt = sum(t for t, _ in points) / n
+    my = sum(y for _, y in points) / n
+    var = sum((t - mt) ** 2 for t, _ in points)
+    return sum((t - mt) * (y - my) for t, y in points) / var if var else 0.0
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def sut_env(slack: FakeSlack, cohere: FakeCohere, workdir: str, mock_llm: bool) -> Dict[str, str]:
+    """Environment for the system under test: every external endpoint points at a fake."""
+    return {
+        "SLACK_BOT_TOKEN": "xoxb-load-test", "SLACK_APP_TOKEN": "xapp-load-test", "SLACK_SIGNING_SECRET": "load-test",
+        "SLACK_CHANNEL_ID": "CLOADTEST", "SLACK_API_URL": slack.url,
+        "COHERE_API_KEY": "load-test", "COHERE_BASE_URL": cohere.url,
+        "MOCK_MODE": "true" if mock_llm else "false", "DEMO_MODE": "false", "EMBED_PROVIDER": "cohere",
+        "KB_DIR": str(ROOT / "kb"), "INDEX_PATH": os.path.join(workdir, "kb_index.json"),
+        "TAIL_PATHS": os.path.join(workdir, "no-such.log"), "TAIL_CHECKPOINT": os.path.join(workdir, "tail.json"),
+        "LLM_CACHE_DB": "", "INCIDENT_DB": os.path.join(workdir, "incidents.db"),
+        "ASSET_CACHE": os.path.join(workdir, "slack_assets.json"),
+    }
+
+def events(args) -> Iterator[Tuple[str, dict]]:
+    """(trace IP, SiemEvent JSON) pairs from --replay or the synthetic generator."""
+    if args.replay:
+        with open(args.replay, encoding="utf-8") as f:
+            for ln in f:
+                ln = ln.strip()
+                if not ln:
+                    continue
+                evt = json.loads(ln) if ln.startswith("{") else {"message": ln}
+                m = _IP_RE.search(json.dumps(evt))
+                yield (m.group(0) if m else None), evt
+        return
+    n = int(args.rate * args.duration)
+    for ln in generate(lines=n, mix=args.mix, fmt=args.fmt, seed=args.seed, sequential_ips=True):
+        yield _IP_RE.search(ln).group(0), {"source": "loadtest", "message": ln}
+
+class Target:
+    def start(self) -> None: ...
+    def send(self, evt: dict) -> str: ...               # "accepted" | "rejected" | "error"
+    def queue_depth(self) -> int: ...                   # triage backlog plus queued Slack calls
+    def stop(self) -> None: ...
+
+class HttpTarget(Target):
+    """server.py in a uvicorn subprocess, driven through POST /ingest/siem."""
+
+    def __init__(self, env: Dict[str, str]):
+        self.env = env
+        self.port = _free_port()
+        self.base = f"http://127.0.0.1:{self.port}"
+        self.proc: subprocess.Popen | None = None
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, "s"):
+            self._local.s = requests.Session()
+        return self._local.s
+
+    def start(self) -> None:
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:api", "--host", "127.0.0.1", "--port", str(self.port),
+             "--log-level", "warning"], cwd=ROOT, env={**os.environ, **self.env})
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise SystemExit("server.py exited during startup")
+            try:
+                requests.get(self.base + "/ingest/queue", timeout=1)
+                return
+            except requests.RequestException:
+                time.sleep(0.2)
+        raise SystemExit("server.py did not come up within 60s")
+
+    def send(self, evt: dict) -> str:
+        try:
+            r = self._session().post(self.base + "/ingest/siem", json=evt, timeout=10)
+        except requests.RequestException:
+            return "error"
+        return {202: "accepted", 429: "rejected"}.get(r.status_code, "error")
+
+    def queue_depth(self) -> int:
+        try:
+            q = requests.get(self.base + "/ingest/queue", timeout=2).json()
+            return q.get("depth", 0) + q.get("delivery", {}).get("queued", 0)
+        except (requests.RequestException, ValueError):
+            return -1
+
+    def stop(self) -> None:
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+class MentionTarget(Target):
+    """app.py imported in-process; each event becomes an app_mention handled synchronously."""
+
+    def __init__(self, env: Dict[str, str]):
+        self.env = env
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        os.environ.update(self.env)
+        sys.path.insert(0, str(ROOT))
+        import app  # reads the env above at import
+        app.start_background()
+        self.app = app
+        self.log = logging.getLogger("loadtest")
+
+    def send(self, evt: dict) -> str:
+        body = {"event": {"type": "app_mention", "channel": self.env["SLACK_CHANNEL_ID"],
+                          "text": "<@UFAKEBOT> log " + (evt.get("message") or json.dumps(evt))}}
+        with self._lock:
+            self.inflight += 1
+        try:
+            self.app.on_mention(body=body, say=lambda *a, **k: None, logger=self.log)
+            return "accepted"
+        except Exception:
+            return "error"
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    def queue_depth(self) -> int:
+        return self.inflight + self.app.delivery.stats()["queued"]
+
+def run(args) -> Dict:
+    slack = FakeSlack(Faults(args.slack_latency, args.slack_jitter, args.slack_error_rate, args.slack_429_rate)).start()
+    cohere = FakeCohere(Faults(args.cohere_latency, args.cohere_jitter, args.cohere_error_rate, args.cohere_429_rate)).start()
+    workdir = tempfile.mkdtemp(prefix="triageo-load-")
+    env = sut_env(slack, cohere, workdir, args.mock_llm)
+    target = HttpTarget(env) if args.target == "http" else MentionTarget(env)
+    target.start()
+
+    sent_at: Dict[str, float] = {}
+    outcomes = {"accepted": 0, "rejected": 0, "error": 0}
+    depth: List[Tuple[float, int]] = []
+    lock = threading.Lock()
+    stop_sampling = threading.Event()
+
+    def sample():
+        while not stop_sampling.is_set():
+            depth.append((time.monotonic() - t0, target.queue_depth()))
+            stop_sampling.wait(args.sample_s)
+
+    def fire(ip, evt):
+        t = time.monotonic()
+        outcome = target.send(evt)
+        with lock:
+            outcomes[outcome] += 1
+            if outcome == "accepted" and ip and ip not in sent_at:
+                sent_at[ip] = t
+
+    t0 = time.monotonic()
+    threading.Thread(target=sample, daemon=True).start()
+    pool = ThreadPoolExecutor(max_workers=args.concurrency)
+    sends = []
+    for i, (ip, evt) in enumerate(events(args)):
+        due = t0 + i / args.rate
+        if due - time.monotonic() > 0:
+            time.sleep(due - time.monotonic())
+        if time.monotonic() - t0 > args.duration:
+            break
+        sends.append(pool.submit(fire, ip, evt))
+    send_end = time.monotonic()
+
+    drain_deadline = send_end + args.drain
+    while time.monotonic() < drain_deadline:
+        with lock:
+            pending = sum(not f.done() for f in sends) + sum(1 for ip in sent_at if ip not in slack.final_card)
+        if not pending:
+            break
+        time.sleep(0.2)
+    pool.shutdown(wait=False, cancel_futures=True)
+    stop_sampling.set()
+    target.stop()
+    slack.stop()
+    cohere.stop()
+
+    first = [slack.first_card[ip] - t for ip, t in sent_at.items() if ip in slack.first_card]
+    final = [slack.final_card[ip] - t for ip, t in sent_at.items() if ip in slack.final_card]
+    cards_in_window = sum(1 for ip in sent_at if slack.first_card.get(ip, float("inf")) <= send_end)
+    window = send_end - t0
+    depths = [d for _, d in depth if d >= 0]
+    return {
+        "target": args.target, "rate": args.rate, "duration_s": round(window, 2),
+        "sent": sum(outcomes.values()), **outcomes,
+        "cards": len(first), "final_cards": len(final), "missing_cards": len(sent_at) - len(first),
+        "sustained_cards_per_s": round(cards_in_window / window, 2) if window else 0.0,
+        "time_to_first_card_ms": {f"p{p}": _ms(percentile(first, p)) for p in (50, 95, 99)},
+        "time_to_final_card_ms": {f"p{p}": _ms(percentile(final, p)) for p in (50, 95, 99)},
+        # growth_per_s well above 0 means the backlog kept growing: the offered rate is above capacity
+        "queue_depth": {"max": max(depths, default=0), "end": depths[-1] if depths else 0,
+                        "growth_per_s": round(slope([(t, d) for t, d in depth if d >= 0 and t <= window]), 2)},
+        "slack_calls": {k.rsplit("/", 1)[-1]: v for k, v in sorted(slack.calls.items())},
+        "slack_injected": slack.injected,
+        "cohere_calls": {k.rsplit("/", 1)[-1]: v for k, v in sorted(cohere.calls.items())},
+        "cohere_injected": cohere.injected,
+    }
+
+def _ms(v: float | None) -> float | None:
+    return None if v is None else round(v * 1000, 1)
+
+def main(argv: List[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Load-test Triageo against fake Slack and Cohere servers.")
+    ap.add_argument("--target", choices=("http", "mention"), default="http")
+    ap.add_argument("--rate", type=float, default=20.0, help="events per second")
+    ap.add_argument("--duration", type=float, default=15.0, help="seconds of sending")
+    ap.add_argument("--drain", type=float, default=30.0, help="max seconds to wait for outstanding cards")
+    ap.add_argument("--concurrency", type=int, default=64, help="max in-flight sends")
+    ap.add_argument("--replay", help="file of events: SiemEvent JSON per line, or plain log lines")
+    ap.add_argument("--fmt", default="text", help="synthetic event format (text, nginx, json, syslog)")
+    ap.add_argument("--mix", type=parse_mix, default=None, help="synthetic attack mix, as in bench.synth")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--mock-llm", action="store_true", help="use the built-in mock LLM instead of the fake Cohere chat")
+    ap.add_argument("--sample-s", type=float, default=0.5, help="queue depth sampling period")
+    for svc, lat in (("slack", 0.05), ("cohere", 0.3)):
+        ap.add_argument(f"--{svc}-latency", type=float, default=lat)
+        ap.add_argument(f"--{svc}-jitter", type=float, default=lat / 2)
+        ap.add_argument(f"--{svc}-error-rate", type=float, default=0.0)
+        ap.add_argument(f"--{svc}-429-rate", type=float, default=0.0)
+    ap.add_argument("--json", help="also write the report to this file")
+    args = ap.parse_args(argv)
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
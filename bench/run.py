@@ -0,0 +1,249 @@
+# bench/run.py — micro-benchmarks for the triage hot paths
+#
+#   python -m bench.run                    # run, print, write bench/last.json, compare with bench/baseline.json
+#   python -m bench.run --save-baseline    # ...and make this run the new baseline
+#   python -m bench.run --quick --only parse
+#
+# Each case reports throughput (median of timed runs), peak traced memory and
+# the memory/blocks a single call leaves allocated. Memory is measured in a
+# separate run under tracemalloc so it does not skew the timings.
+import argparse, json, os, shutil, statistics, sys, tempfile, time, tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+os.environ.setdefault("MOCK_MODE", "true")        # never call a real LLM from a benchmark
+os.environ.setdefault("EMBED_PROVIDER", "local")
+
+from bench.synth import kb_docs, log_text
+
+HERE = Path(__file__).resolve().parent
+LAST_PATH = HERE / "last.json"
+BASELINE_PATH = HERE / "baseline.json"
+
+CASES: List[Tuple[str, str, Callable[[bool], Tuple[Callable[[], object], int]]]] = []
+
+def case(name: str, unit: str):
+    """Register ``setup(quick) -> (fn, units_per_call)``; throughput is reported in ``unit``/s."""
+    def wrap(setup):
+        CASES.append((name, unit, setup))
+        return setup
+    return wrap
+
+# ---- cases ----
+for _fmt in ("text", "nginx", "json"):
+    @case(f"parse_log[{_fmt}]", "lines")
+    def _parse(quick: bool, fmt=_fmt):
+        from triage import parse_log
+        n = 20_000 if quick else 200_000
+        text = log_text(lines=n, fmt=fmt, ips=5000)
+        return (lambda: parse_log(text)), n
+
+@case("parse_log[high-cardinality]", "lines")
+def _parse_many_ips(quick: bool):
+    from triage import parse_log
+    n = 20_000 if quick else 200_000
+    text = log_text(lines=n, ips=n, mix={"failed_login": 0.3, "sqli": 0.1, "server_error": 0.1, "prompt_injection": 0.01})
+    return (lambda: parse_log(text)), n
+
+@case("baseline+summarize", "ops")
+def _score(quick: bool):
+    from triage import baseline_severity, parse_log, summarize
+    parsed = parse_log(log_text(lines=5000, ips=500))
+    n = 1000
+    def run():
+        for _ in range(n):
+            baseline_severity(parsed)
+            summarize(parsed)
+    return run, n
+
+@case("triage_blocks", "ops")
+def _blocks(quick: bool):
+    from blockkit import triage_blocks
+    from llm import _mock_result
+    from triage import parse_log, summarize
+    parsed = parse_log(log_text(lines=5000, ips=500))
+    tr = _mock_result(summarize(parsed), "high", ["evidence snippet one", "evidence snippet two"])
+    n = 1000
+    def run():
+        for _ in range(n):
+            triage_blocks(tr, parsed)
+    return run, n
+
+@case("triage_with_llm[mock]", "ops")
+def _llm(quick: bool):
+    import llm
+    n = 1000
+    def run():
+        for i in range(n):
+            llm.triage_with_llm(summary=f"failed_logins={i}, top_ip=1.2.3.4", baseline="high", evidence_snippets=["a", "b"])
+    return run, n
+
+class _KB:
+    """A throwaway KB directory of ``chunks`` chunks that rag's module paths point at."""
+
+    def __init__(self, chunks: int):
+        self.dir = tempfile.mkdtemp(prefix="bench-kb-")
+        os.makedirs(os.path.join(self.dir, "kb"))
+        with open(os.path.join(self.dir, "kb", "runbooks.md"), "w", encoding="utf-8") as f:
+            f.write("\n\n".join(kb_docs(chunks)))
+
+    def use(self) -> None:
+        import rag
+        rag.KB_DIR = os.path.join(self.dir, "kb")
+        rag.INDEX_PATH = os.path.join(self.dir, "index.json")
+        rag.VECTORS_PATH = os.path.join(self.dir, "index.npy")
+
+    def clear_index(self) -> None:
+        import rag
+        for p in (rag.INDEX_PATH, rag.VECTORS_PATH):
+            if os.path.exists(p):
+                os.remove(p)
+        rag._kb_signature = None
+
+_KBS: List[_KB] = []
+
+def _kb(chunks: int) -> _KB:
+    kb = _KB(chunks)
+    _KBS.append(kb)
+    kb.use()
+    return kb
+
+for _chunks in (10, 100, 1000):
+    @case(f"build_index[cold,{_chunks}]", "chunks")
+    def _build_cold(quick: bool, chunks=_chunks):
+        import rag
+        kb = _kb(chunks)
+        def run():
+            kb.use()
+            kb.clear_index()
+            rag.build_index()
+        return run, chunks
+
+    @case(f"build_index[unchanged,{_chunks}]", "calls")
+    def _build_warm(quick: bool, chunks=_chunks):
+        import rag
+        kb = _kb(chunks)
+        rag.build_index()
+        def run():
+            kb.use()
+            rag.build_index()
+        return run, 1
+
+    @case(f"search[{_chunks}]", "queries")
+    def _search(quick: bool, chunks=_chunks):
+        import rag
+        _kb(chunks)
+        rag.build_index()
+        index = rag.VectorIndex(rag.INDEX_PATH, rag.VECTORS_PATH)
+        queries = [f"failed_logins={i}, top_ip=10.0.0.{i % 250}" for i in range(50)]
+        def run():
+            for q in queries:
+                index.search(q, k=3)
+        return run, len(queries)
+
+    @case(f"search_many[{_chunks}]", "queries")
+    def _search_many(quick: bool, chunks=_chunks):
+        import rag
+        _kb(chunks)
+        rag.build_index()
+        index = rag.VectorIndex(rag.INDEX_PATH, rag.VECTORS_PATH)
+        queries = [f"suspicious_paths={i}, top_ip=10.0.0.{i % 250}" for i in range(50)]
+        def run():
+            index.search_many(queries, k=3)
+        return run, len(queries)
+
+# ---- measurement ----
+def measure(fn: Callable[[], object], units: int, repeat: int, min_time: float) -> Dict[str, float]:
+    fn()  # warm caches and lazy imports
+    times = []
+    start = time.perf_counter()
+    while len(times) < repeat or time.perf_counter() - start < min_time:
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+        if len(times) >= repeat * 10:
+            break
+    med = statistics.median(times)
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    fn()
+    retained = sys.getallocatedblocks() - blocks
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "throughput": units / med if med else float("inf"),
+        "median_ms": med * 1000,
+        "min_ms": min(times) * 1000,
+        "runs": len(times),
+        "peak_kib": peak / 1024,
+        "retained_kib": current / 1024,
+        "retained_blocks": retained,
+    }
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Names of cases whose throughput fell or peak memory grew by more than ``tolerance``."""
+    worse = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if not b:
+            continue
+        slower = r["throughput"] < b["throughput"] * (1 - tolerance)
+        bigger = r["peak_kib"] > b["peak_kib"] * (1 + tolerance) and r["peak_kib"] - b["peak_kib"] > 64
+        if slower or bigger:
+            worse.append(name)
+    return worse
+
+def _fmt_row(name: str, unit: str, r: Dict, b: Dict | None) -> str:
+    delta = f"{(r['throughput'] / b['throughput'] - 1) * 100:+6.1f}%" if b else "     -"
+    return (f"{name:<32} {r['throughput']:>14,.0f} {unit + '/s':<10} {delta} {r['median_ms']:>10.2f} ms"
+            f" {r['peak_kib']:>10,.0f} KiB peak {r['retained_blocks']:>8,d} blocks")
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark the triage hot paths.")
+    ap.add_argument("--quick", action="store_true", help="smaller inputs, fewer runs")
+    ap.add_argument("--only", default="", help="run cases whose name contains this")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--min-time", type=float, default=1.0, help="seconds of timed runs per case")
+    ap.add_argument("--baseline", default=str(BASELINE_PATH))
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.10, help="allowed throughput/memory regression (fraction)")
+    ap.add_argument("--fail-on-regression", action="store_true")
+    a = ap.parse_args(argv)
+    if a.quick:
+        a.repeat, a.min_time = min(a.repeat, 3), min(a.min_time, 0.2)
+
+    baseline = {}
+    if os.path.exists(a.baseline):
+        with open(a.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+
+    results = {}
+    try:
+        for name, unit, setup in CASES:
+            if a.only not in name:
+                continue
+            fn, units = setup(a.quick)
+            r = measure(fn, units, a.repeat, a.min_time)
+            r["unit"] = unit
+            results[name] = r
+            print(_fmt_row(name, unit, r, baseline.get(name)), flush=True)
+    finally:
+        for kb in _KBS:
+            shutil.rmtree(kb.dir, ignore_errors=True)
+
+    doc = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+           "quick": a.quick, "results": results}
+    LAST_PATH.write_text(json.dumps(doc, indent=2))
+    if a.save_baseline:
+        Path(a.baseline).write_text(json.dumps(doc, indent=2))
+        print(f"💾 Baseline saved to {a.baseline}")
+
+    worse = compare(results, baseline, a.tolerance)
+    if worse:
+        print(f"⚠️ Regressions beyond {a.tolerance:.0%} vs baseline: " + ", ".join(worse))
+    elif baseline:
+        print("✅ No regressions vs baseline.")
+    return 1 if worse and a.fail_on_regression else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
-from typing import List
+from typing import Dict, List
+from metrics import timed
 from schemas import TriageResult
 
 SEV_EMOJI = {
@@ -8,7 +9,12 @@ SEV_EMOJI = {
     "low": "🟢",
 }
 
-def triage_blocks(tr: TriageResult) -> List[dict]:
+def _source_line(parsed: Dict) -> str:
+    top = ", ".join(f"`{ip}` ({n})" for ip, n in parsed.get("top_ips") or [])
+    return f"*Sources:* {parsed.get('distinct_ips', 0):,} distinct IPs" + (f"; top: {top}" if top else ", no dominant source")
+
+@timed("render")
+def triage_blocks(tr: TriageResult, parsed: Dict | None = None) -> List[dict]:
     sev = tr.severity
     emoji = SEV_EMOJI.get(sev, "❗")
     actions = "\n".join([f"• {a}" for a in tr.recommended_actions])
@@ -20,6 +26,10 @@ def triage_blocks(tr: TriageResult) -> List[dict]:
         {"type": "section", "text": {"type": "mrkdwn", "text": f"*Category:* `{tr.category}`\n*Summary:* {tr.summary}"}},
         {"type": "section", "text": {"type": "mrkdwn", "text": f"*Recommended actions:*\n{actions}"}},
         {"type": "context", "elements": [{"type": "mrkdwn", "text": f"*Evidence:*\n{ev}"}]},
+    ]
+    if parsed and (parsed.get("top_ips") or parsed.get("distinct_ips", 0) > 1):
+        blocks.append({"type": "context", "elements": [{"type": "mrkdwn", "text": _source_line(parsed)}]})
+    blocks += [
         {"type": "actions", "elements": [
             {"type": "button", "text": {"type": "plain_text", "text": "🚨 Escalate"}, "value": "escalate", "action_id": "btn_escalate"},
             {"type": "button", "text": {"type": "plain_text", "text": "👀 Acknowledge"}, "value": "ack", "action_id": "btn_ack"},
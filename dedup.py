@@ -0,0 +1,151 @@
+# dedup.py — fold repeated alerts into one Slack card per fingerprint and time window
+import hashlib, os, threading, time
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+DEDUP_WINDOW_S = float(os.getenv("DEDUP_WINDOW_S", "900"))         # max lifetime of one card; 0 disables dedup
+DEDUP_IDLE_S = float(os.getenv("DEDUP_IDLE_S", "120"))              # close a window after this much quiet
+DEDUP_UPDATE_INTERVAL_S = float(os.getenv("DEDUP_UPDATE_INTERVAL_S", "10"))  # min gap between chat_update calls
+
+def fingerprint(category: str, severity: str, top_ip: str | None, rule: str | None = None) -> str:
+    key = "|".join([category or "-", severity or "-", top_ip or "-", rule or "-"])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+def parsed_category(parsed: Dict) -> str:
+    counts = parsed["counts"]
+    return max(counts, key=counts.get) if any(counts.values()) else "none"
+
+def parsed_fingerprint(parsed: Dict, baseline: str, rule: str | None = None) -> str:
+    """Fingerprint from the heuristic stage, so duplicates are caught before any LLM call."""
+    return fingerprint(parsed_category(parsed), baseline, parsed.get("top_ip"), rule)
+
+@dataclass
+class _Window:
+    opened: float
+    last_seen: float
+    count: int = 1
+    ts: str | None = None          # None while the first card is still being rendered/posted
+    blocks: List[dict] = field(default_factory=list)
+    last_update: float = 0.0
+    dirty: bool = False
+
+class AlertAggregator:
+    """Per-(channel, fingerprint) windows: the first alert posts a card, repeats bump its counter.
+
+    Callers ``claim()`` before doing any expensive work; a False return means
+    the alert was folded into an open window. Otherwise they render, post, and
+    report the message ts via ``opened()`` (or ``release()`` on failure).
+    Counter updates go out through ``chat_update`` at most every
+    ``update_interval`` seconds per card, with a final flush when the window closes.
+    """
+
+    def __init__(self, client, window: float = DEDUP_WINDOW_S, idle: float = DEDUP_IDLE_S,
+                 update_interval: float = DEDUP_UPDATE_INTERVAL_S, clock=time.time):
+        self.client = client
+        self.window = window
+        self.idle = idle
+        self.update_interval = update_interval
+        self.clock = clock
+        self._windows: Dict[Tuple[str, str], _Window] = {}
+        self._lock = threading.Lock()
+        self._sweeper: threading.Thread | None = None
+        self.suppressed = 0
+
+    def start(self) -> None:
+        """Run sweep() in the background so idle windows close and pending counts flush on time."""
+        if self._sweeper or self.window <= 0:
+            return
+        period = max(0.5, min(self.idle, self.update_interval) / 2)
+        def loop():
+            while True:
+                time.sleep(period)
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print("Dedup sweep failed:", repr(e))
+        self._sweeper = threading.Thread(target=loop, name="dedup-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _is_open(self, w: _Window, now: float) -> bool:
+        return now - w.opened < self.window and now - w.last_seen < self.idle
+
+    def claim(self, channel: str, fp: str) -> bool:
+        if self.window <= 0:
+            return True
+        now = self.clock()
+        flush = None
+        with self._lock:
+            w = self._windows.get((channel, fp))
+            if w is not None and self._is_open(w, now):
+                w.count += 1
+                w.last_seen = now
+                w.dirty = True
+                self.suppressed += 1
+                if w.ts and now - w.last_update >= self.update_interval:
+                    flush = self._take_update(w, now)
+                claimed = False
+            else:
+                self._windows[(channel, fp)] = _Window(opened=now, last_seen=now)
+                claimed = True
+        if flush:
+            self._send_update(channel, *flush)
+        return claimed
+
+    def opened(self, channel: str, fp: str, ts: str | None, blocks: List[dict]) -> None:
+        if self.window <= 0:
+            return
+        with self._lock:
+            w = self._windows.get((channel, fp))
+            if w is None:
+                return
+            if ts is None:
+                del self._windows[(channel, fp)]
+                return
+            w.ts, w.blocks, w.last_update = ts, blocks, self.clock()
+
+    def revise(self, channel: str, fp: str, ts: str, blocks: List[dict]) -> bool:
+        """Swap in new card content (e.g. the LLM card replacing a heuristic one) and push it now.
+
+        Returns False when the card's window has already closed; the caller then updates it itself.
+        """
+        with self._lock:
+            w = self._windows.get((channel, fp))
+            if w is None or w.ts != ts:
+                return False
+            w.blocks = blocks
+            ts, blocks = self._take_update(w, self.clock()) if w.count > 1 else (ts, blocks)
+            w.last_update = self.clock()
+        self._send_update(channel, ts, blocks)
+        return True
+
+    def release(self, channel: str, fp: str) -> None:
+        with self._lock:
+            self._windows.pop((channel, fp), None)
+
+    def sweep(self) -> None:
+        now = self.clock()
+        flushes = []
+        with self._lock:
+            for key, w in list(self._windows.items()):
+                is_open = self._is_open(w, now)
+                if w.ts and w.dirty and (not is_open or now - w.last_update >= self.update_interval):
+                    flushes.append((key[0],) + self._take_update(w, now))
+                if not is_open:
+                    del self._windows[key]
+        for channel, ts, blocks in flushes:
+            self._send_update(channel, ts, blocks)
+
+    def _take_update(self, w: _Window, now: float) -> Tuple[str, List[dict]]:
+        w.dirty = False
+        w.last_update = now
+        first = time.strftime("%H:%M:%S", time.localtime(w.opened))
+        last = time.strftime("%H:%M:%S", time.localtime(w.last_seen))
+        note = {"type": "context", "elements": [{"type": "mrkdwn",
+                "text": f"🔁 Seen *{w.count}* times · first {first} · last {last}"}]}
+        return w.ts, w.blocks + [note]
+
+    def _send_update(self, channel: str, ts: str, blocks: List[dict]) -> None:
+        try:
+            self.client.chat_update(channel=channel, ts=ts, text="🔔 Triageo alert (updated)", blocks=blocks)
+        except Exception as e:
+            print("chat_update failed:", repr(e))
@@ -0,0 +1,290 @@
+# delivery.py — paced, prioritized, retrying Slack Web API delivery
+import heapq, itertools, os, random, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Tuple
+
+import requests
+from slack_sdk.errors import SlackApiError, SlackRequestError
+from slack_sdk.web import WebClient
+
+from metrics import SLACK_ERRORS, stage
+
+SLACK_API_URL = os.getenv("SLACK_API_URL", "https://slack.com/api/")  # point at a fake server in tests
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", "4"))
+DELIVERY_MAX_RETRIES = int(os.getenv("DELIVERY_MAX_RETRIES", "5"))
+DELIVERY_BACKOFF_S = float(os.getenv("DELIVERY_BACKOFF_S", "1.0"))
+DELIVERY_BACKOFF_MAX_S = float(os.getenv("DELIVERY_BACKOFF_MAX_S", "60"))
+DELIVERY_QUEUE_MAX = int(os.getenv("DELIVERY_QUEUE_MAX", "5000"))       # queued calls before the lowest priority is shed
+DELIVERY_CALL_TIMEOUT_S = float(os.getenv("DELIVERY_CALL_TIMEOUT_S", "60"))  # default wait in call()
+
+# method -> (requests/second, burst, bucket per channel?). chat.postMessage is limited
+# to ~1 msg/s per channel; the rest follow Slack's per-workspace method tiers.
+METHOD_LIMITS: Dict[str, Tuple[float, int, bool]] = {
+    "chat_postMessage": (1.0, 3, True),
+    "chat_update": (50 / 60, 5, False),      # Tier 3
+    "files_upload_v2": (20 / 60, 2, False),  # Tier 2
+}
+DEFAULT_LIMIT = (50 / 60, 5, False)          # Tier 3
+
+# latency stage each Web API method is timed under; anything else is "slack_other"
+METHOD_STAGES = {"chat_postMessage": "slack_post", "chat_update": "slack_update", "files_upload_v2": "image_upload"}
+
+PRIORITY = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+
+class DeliveryQueueFull(RuntimeError):
+    """The delivery queue is at DELIVERY_QUEUE_MAX and this call ranked lowest."""
+
+class DeliveryStopped(RuntimeError):
+    """The delivery queue was stopped before this call went out."""
+
+def _error_name(err: Exception) -> str:
+    """Slack's error code ("ratelimited", "channel_not_found", ...) or the exception type."""
+    if isinstance(err, SlackApiError):
+        return str(err.response.get("error") or getattr(err.response, "status_code", "unknown"))
+    return type(err).__name__
+
+class PooledWebClient(WebClient):
+    """WebClient whose HTTP calls go through one keep-alive requests.Session instead of a fresh urllib connection."""
+
+    def __init__(self, *args, pool_size: int = 16, **kwargs):
+        kwargs.setdefault("base_url", SLACK_API_URL)
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _perform_urllib_http_request_internal(self, url, req):
+        resp = self.session.request(req.get_method(), url, headers=dict(req.header_items()),
+                                    data=req.data, timeout=self.timeout)
+        body = resp.content if resp.headers.get("Content-Type", "").startswith("application/gzip") else resp.text
+        return {"status": resp.status_code, "headers": resp.headers, "body": body}
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+        self.blocked_until = 0.0  # set from Retry-After
+
+    def ready_at(self, now: float) -> float:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.blocked_until:
+            return self.blocked_until
+        return now if self.tokens >= 1 else now + (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+@dataclass
+class _Job:
+    method: str
+    kwargs: Dict[str, Any]
+    key: Tuple
+    future: Future = field(default_factory=Future)
+    attempts: int = 0
+    not_before: float = 0.0
+
+class _Lane:
+    """Client-like facade: ``lane.chat_update(...)`` queues the call at a fixed priority."""
+
+    def __init__(self, delivery: "SlackDelivery", priority):
+        self._delivery, self._priority = delivery, priority
+
+    def __getattr__(self, method: str):
+        return lambda **kwargs: self._delivery.submit(method, self._priority, **kwargs)
+
+class SlackDelivery:
+    """Queue of Slack API calls, dispatched by priority under per-method/per-channel token buckets.
+
+    Calls for the same bucket go out one at a time in (priority, submit order).
+    A 429 pauses that bucket for Retry-After seconds and re-queues the call.
+    Transport errors and 5xx are retried with full-jitter exponential backoff.
+    Other Slack errors fail the returned Future straight away. When ``queue_max``
+    calls are waiting, the lowest-priority newest one is failed with DeliveryQueueFull.
+    """
+
+    def __init__(self, client: WebClient, workers: int = DELIVERY_WORKERS, max_retries: int = DELIVERY_MAX_RETRIES,
+                 queue_max: int = DELIVERY_QUEUE_MAX, clock=time.monotonic):
+        self.client = client
+        self.max_retries = max_retries
+        self.queue_max = queue_max
+        self.clock = clock
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._buckets: Dict[Tuple, TokenBucket] = {}
+        self._inflight: set = set()
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="slack-delivery")
+        self._thread: threading.Thread | None = None
+        self._stopped = False
+        self.sent = self.retried = self.rate_limited = self.failed = self.shed = 0
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread or self._stopped:
+                return
+            self._thread = threading.Thread(target=self._dispatch, name="slack-dispatch", daemon=True)
+            self._thread.start()
+
+    def submit(self, method: str, priority: int | str = "medium", **kwargs) -> Future:
+        self.start()
+        if isinstance(priority, str):
+            priority = PRIORITY.get(priority, PRIORITY["medium"])
+        per_channel = METHOD_LIMITS.get(method, DEFAULT_LIMIT)[2]
+        key = (method, kwargs.get("channel")) if per_channel else (method,)
+        job = _Job(method, kwargs, key)
+        item, dropped = (priority, next(self._seq), job), None
+        with self._cond:
+            if self._stopped:
+                dropped = item
+            elif len(self._heap) >= self.queue_max:
+                worst = max(self._heap, key=lambda it: it[:2])
+                if item[:2] < worst[:2]:
+                    self._heap.remove(worst)
+                    heapq.heapify(self._heap)
+                    heapq.heappush(self._heap, item)
+                    dropped = worst
+                else:
+                    dropped = item
+                self.shed += 1
+            else:
+                heapq.heappush(self._heap, item)
+            self._cond.notify()
+        if dropped is not None:
+            err = DeliveryStopped("delivery stopped") if self._stopped else DeliveryQueueFull(f"{self.queue_max} calls queued")
+            self._fail(dropped[2], err)
+        return job.future
+
+    def call(self, method: str, priority: int | str = "medium", timeout: float | None = DELIVERY_CALL_TIMEOUT_S, **kwargs):
+        """submit() and wait at most ``timeout`` seconds for the Slack response (raises the final error)."""
+        return self.submit(method, priority, **kwargs).result(timeout)
+
+    def stop(self) -> None:
+        """Stop dispatching and fail every call still queued with DeliveryStopped."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._pool.shutdown(wait=False)
+        self._fail_queued(DeliveryStopped("delivery stopped"))
+
+    def _fail_queued(self, err: Exception) -> None:
+        with self._cond:
+            pending, self._heap = self._heap, []
+        for _, _, job in pending:
+            self._fail(job, err)
+
+    def lane(self, priority: int | str) -> _Lane:
+        return _Lane(self, priority)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            queued = len(self._heap)
+        return {"queued": queued, "inflight": len(self._inflight), "sent": self.sent, "retried": self.retried,
+                "rate_limited": self.rate_limited, "failed": self.failed, "shed": self.shed}
+
+    def _bucket(self, method: str, key: Tuple, now: float) -> TokenBucket:
+        b = self._buckets.get(key)
+        if b is None:
+            rate, burst, _ = METHOD_LIMITS.get(method, DEFAULT_LIMIT)
+            b = self._buckets[key] = TokenBucket(rate, burst, now)
+        return b
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._cond:
+                if self._stopped:
+                    break
+                now = self.clock()
+                picked, wait, held, blocked = None, None, [], set()
+                while self._heap:
+                    item = heapq.heappop(self._heap)
+                    job = item[2]
+                    if job.key in self._inflight or job.key in blocked:
+                        held.append(item)
+                        continue
+                    ready = max(job.not_before, self._bucket(job.method, job.key, now).ready_at(now))
+                    if ready <= now:
+                        picked = item
+                        break
+                    # First queued job of a bucket decides for the whole bucket, keeping order.
+                    blocked.add(job.key)
+                    held.append(item)
+                    wait = ready - now if wait is None else min(wait, ready - now)
+                for item in held:
+                    heapq.heappush(self._heap, item)
+                if picked is None:
+                    self._cond.wait(wait)
+                    continue
+                priority, seq, job = picked
+                self._buckets[job.key].take()
+                self._inflight.add(job.key)
+            try:
+                self._pool.submit(self._run, job, priority, seq)
+            except RuntimeError as e:  # executor shut down (stop() or interpreter exit)
+                with self._cond:
+                    self._stopped = True
+                    self._inflight.discard(job.key)
+                self._fail(job, DeliveryStopped(str(e)))
+                break
+            except Exception as e:
+                with self._cond:
+                    self._inflight.discard(job.key)
+                self._fail(job, e)
+        self._fail_queued(DeliveryStopped("delivery stopped"))
+
+    def _run(self, job: _Job, priority: int, seq: int) -> None:
+        retry_at = None
+        try:
+            with stage(METHOD_STAGES.get(job.method, "slack_other")):
+                resp = getattr(self.client, job.method)(**job.kwargs)
+            self.sent += 1
+            job.future.set_result(resp)
+        except SlackApiError as e:
+            status = getattr(e.response, "status_code", 0)
+            if status == 429:
+                self.rate_limited += 1
+                delay = float(e.response.headers.get("Retry-After", 1))
+                with self._cond:
+                    self._buckets[job.key].blocked_until = self.clock() + delay
+                retry_at = self._retry(job, e, delay)
+            elif status >= 500:
+                retry_at = self._retry(job, e)
+            else:
+                self._fail(job, e)
+        except (SlackRequestError, requests.RequestException, OSError) as e:
+            retry_at = self._retry(job, e)
+        except Exception as e:
+            self._fail(job, e)
+        with self._cond:
+            self._inflight.discard(job.key)
+            stopped = self._stopped
+            if retry_at is not None and not stopped:
+                job.not_before = retry_at
+                heapq.heappush(self._heap, (priority, seq, job))
+            self._cond.notify()
+        if retry_at is not None and stopped:
+            self._fail(job, DeliveryStopped("delivery stopped before retry"))
+
+    def _retry(self, job: _Job, err: Exception, delay: float | None = None) -> float | None:
+        SLACK_ERRORS.inc(method=job.method, error=_error_name(err))
+        job.attempts += 1
+        if job.attempts > self.max_retries:
+            self._fail(job, err)
+            return None
+        self.retried += 1
+        if delay is None:
+            delay = random.uniform(0, min(DELIVERY_BACKOFF_MAX_S, DELIVERY_BACKOFF_S * 2 ** (job.attempts - 1)))
+        return self.clock() + delay
+
+    def _fail(self, job: _Job, err: Exception) -> None:
+        if job.future.done():
+            return
+        if job.attempts <= self.max_retries:  # exhausted retries were already counted by _retry
+            SLACK_ERRORS.inc(method=job.method, error=_error_name(err))
+        self.failed += 1
+        print(f"Slack {job.method} failed:", repr(err))
+        job.future.set_exception(err)
@@ -0,0 +1,121 @@
+# detect.py — stateful sliding-window detection for streamed log lines
+import os, time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Tuple
+
+from formats import FORMATS
+from triage import ENGINE, ScanEngine
+
+DETECT_BUCKETS = 12                                       # ring slots per window
+DETECT_MAX_KEYS = int(os.getenv("DETECT_MAX_KEYS", "100000"))  # tracked (rule, key) windows before idle ones are evicted
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    pattern: str          # ScanEngine pattern name
+    threshold: int        # hits within window_s that fire the rule
+    window_s: float = 60.0
+    per: str = "ip"       # "ip": one window per source IP; "global": one shared window
+
+# Rate versions of baseline_severity's count thresholds.
+DEFAULT_RULES = [
+    Rule("auth_bruteforce", "failed_login", threshold=20, window_s=60),
+    Rule("path_probing", "suspicious_path", threshold=10, window_s=60),
+    Rule("error_burst", "server_error", threshold=10, window_s=60, per="global"),
+    Rule("prompt_injection", "llm_prompt_injection", threshold=1, window_s=60),
+]
+
+class RingCounter:
+    """Hit count over a sliding window, kept in ``buckets`` time-stamped slots."""
+
+    def __init__(self, window_s: float, buckets: int = DETECT_BUCKETS):
+        self.width = window_s / buckets
+        self.counts = [0] * buckets
+        self.epochs = [-1] * buckets
+
+    def add(self, now: float, n: int = 1) -> None:
+        epoch = int(now // self.width)
+        slot = epoch % len(self.counts)
+        if self.epochs[slot] != epoch:
+            self.epochs[slot] = epoch
+            self.counts[slot] = 0
+        self.counts[slot] += n
+
+    def total(self, now: float) -> int:
+        epoch = int(now // self.width)
+        size = len(self.counts)
+        return sum(c for c, e in zip(self.counts, self.epochs) if epoch - e < size)
+
+@dataclass
+class _KeyState:
+    ring: RingCounter
+    recent: Deque[str]
+    last_seen: float = 0.0
+    fired_at: float | None = None
+
+@dataclass
+class Trigger:
+    rule: Rule
+    key: str
+    count: int
+    lines: List[str] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        """The window's most recent matching lines, ready for the triage pipeline."""
+        return "\n".join(self.lines)
+
+class SlidingWindowDetector:
+    """Feeds lines through the scan engine and fires rules on per-key hit rates.
+
+    Each (rule, key) has a ring counter and the last ``threshold`` matching
+    lines. A rule fires when its window reaches the threshold, then stays
+    quiet for one window, so downstream triage runs once per burst, not per line.
+    """
+
+    def __init__(self, rules: List[Rule] = DEFAULT_RULES, engine: ScanEngine = ENGINE, clock=time.time):
+        self.engine = engine
+        self.clock = clock
+        self._by_pattern: Dict[str, List[Rule]] = {}
+        for r in rules:
+            self._by_pattern.setdefault(r.pattern, []).append(r)
+        self._state: Dict[Tuple[str, str], _KeyState] = {}
+
+    def feed(self, line: str, now: float | None = None, fmt: str | None = None) -> List[Trigger]:
+        """Scan one line (parsed as ``fmt`` when given) and return the rules it fires."""
+        line = line.strip()
+        if not line:
+            return []
+        rec = FORMATS[fmt].parse(line) if fmt else None
+        hits, ip = self.engine.scan_record(rec) if rec is not None else self.engine.scan(line)
+        if not hits:
+            return []
+        now = self.clock() if now is None else now
+        fired = []
+        for name in hits:
+            for rule in self._by_pattern.get(name, ()):
+                key = (ip or "unknown") if rule.per == "ip" else "*"
+                st = self._state.get((rule.name, key))
+                if st is None:
+                    if len(self._state) >= DETECT_MAX_KEYS:
+                        self._evict(now)
+                    st = self._state[(rule.name, key)] = _KeyState(RingCounter(rule.window_s), deque(maxlen=rule.threshold))
+                st.ring.add(now)
+                st.recent.append(line[:240])
+                st.last_seen = now
+                count = st.ring.total(now)
+                if count >= rule.threshold and (st.fired_at is None or now - st.fired_at >= rule.window_s):
+                    st.fired_at = now
+                    fired.append(Trigger(rule, key, count, list(st.recent)))
+        return fired
+
+    def _evict(self, now: float) -> None:
+        windows = {r.name: r.window_s for rules in self._by_pattern.values() for r in rules}
+        for k, st in list(self._state.items()):
+            if now - st.last_seen >= windows[k[0]]:
+                del self._state[k]
+        if len(self._state) >= DETECT_MAX_KEYS:  # still full of active keys: drop the stalest
+            oldest = sorted(self._state, key=lambda k: self._state[k].last_seen)[:len(self._state) // 10 + 1]
+            for k in oldest:
+                del self._state[k]
@@ -0,0 +1,193 @@
+# formats.py — log format detection and per-format field extraction
+import json, re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List
+from urllib.parse import unquote_plus
+
+SNIFF_LINES = 20  # lines sampled to pick a format
+
+@dataclass(slots=True)
+class Record:
+    """Typed fields pulled out of one log line. ``text`` is what free-text patterns still see."""
+    fmt: str
+    text: str = ""
+    ip: str | None = None
+    status: int | None = None
+    method: str | None = None
+    path: str | None = None
+    user: str | None = None
+    event: str | None = None
+    outcome: str | None = None   # "success" | "failure" when the source says so
+
+@dataclass(frozen=True)
+class LogFormat:
+    name: str
+    sniff: Callable[[str], bool]            # cheap "does this line look like mine"
+    parse: Callable[[str], Record | None]   # None: not parseable, scan the raw line instead
+
+FORMATS: Dict[str, LogFormat] = {}
+
+def register_format(name: str, sniff: Callable[[str], bool], parse: Callable[[str], Record | None]) -> None:
+    """Add a format; detection tries formats in registration order, so register specific ones first."""
+    FORMATS[name] = LogFormat(name, sniff, parse)
+
+def detect_format(lines: Iterable[str]) -> str | None:
+    """Name of the format most sampled lines match (at least half of them), or None for free text."""
+    sample = [ln for ln in (l.strip() for l in lines) if ln][:SNIFF_LINES]
+    best, best_n = None, 0
+    for fmt in FORMATS.values():
+        n = sum(1 for ln in sample if fmt.sniff(ln))
+        if n > best_n:
+            best, best_n = fmt.name, n
+    return best if sample and best_n * 2 >= len(sample) else None
+
+def split_document(text: str) -> List[str] | None:
+    """Compact JSON lines for a whole-file JSON document (CloudTrail ``{"Records": [...]}`` or one object)."""
+    if text.lstrip()[:1] not in ("{", "["):
+        return None
+    try:
+        doc = json.loads(text)
+    except ValueError:
+        return None  # JSON lines, or not JSON at all
+    if isinstance(doc, dict):
+        doc = doc.get("Records", [doc])
+    if not isinstance(doc, list):
+        return None
+    return [json.dumps(r, separators=(",", ":")) for r in doc if isinstance(r, dict)]
+
+# ---- field helpers ----
+def _get(obj: dict, keys: tuple):
+    """First present value among ``keys``; a dotted key also walks nested objects (ECS style)."""
+    for k in keys:
+        if k in obj:
+            v = obj[k]
+        elif "." in k:
+            v = obj
+            for part in k.split("."):
+                v = v.get(part) if isinstance(v, dict) else None
+        else:
+            continue
+        if v not in (None, "", "-"):
+            return v
+    return None
+
+def _int(v) -> int | None:
+    if isinstance(v, int):
+        return v
+    return int(v) if isinstance(v, str) and v.isdigit() else None
+
+def _str(v) -> str | None:
+    """``v`` if it is a non-empty string; fields of any other JSON type are dropped."""
+    return v if isinstance(v, str) and v else None
+
+def _unquote(s: str) -> str:
+    return unquote_plus(s) if "%" in s or "+" in s else s
+
+# ---- CloudTrail ----
+def _sniff_cloudtrail(line: str) -> bool:
+    return line.startswith("{") and '"eventName"' in line and '"eventSource"' in line
+
+def _parse_cloudtrail(line: str) -> Record | None:
+    try:
+        e = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(e, dict):
+        return None
+    ident = e.get("userIdentity")
+    ident = ident if isinstance(ident, dict) else {}
+    user = _str(ident.get("userName")) or (_str(ident.get("arn")) or "").rpartition("/")[2] or None
+    outcome = None
+    resp = e.get("responseElements")
+    login = _str(resp.get("ConsoleLogin")) if isinstance(resp, dict) else None
+    if login:
+        outcome = login.lower()
+    elif e.get("errorCode"):
+        outcome = "failure"
+    text = " ".join(str(v) for v in (e.get("eventName"), e.get("errorCode"), e.get("errorMessage")) if v)
+    return Record("cloudtrail", text=text, ip=_str(e.get("sourceIPAddress")), user=user,
+                  event=_str(e.get("eventName")), outcome=outcome)
+
+# ---- JSON lines (generic / ECS-ish) ----
+IP_KEYS = ("src_ip", "source_ip", "client_ip", "remote_addr", "remote_ip", "clientip", "ip", "source.ip", "client.ip")
+STATUS_KEYS = ("status", "status_code", "statusCode", "response_code", "http_status", "http.response.status_code")
+METHOD_KEYS = ("method", "http_method", "request_method", "http.request.method")
+PATH_KEYS = ("path", "uri", "url", "request_uri", "request", "url.path", "url.original")
+USER_KEYS = ("user", "username", "user_name", "userName", "user.name")
+EVENT_KEYS = ("event", "event_type", "eventName", "action", "event.action")
+OUTCOME_KEYS = ("outcome", "result", "event.outcome")
+MESSAGE_KEYS = ("message", "msg", "log", "error", "prompt")
+
+def _sniff_json(line: str) -> bool:
+    return line.startswith("{") and line.endswith("}")
+
+def _parse_json(line: str) -> Record | None:
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(obj, dict):
+        return None
+    path = _get(obj, PATH_KEYS)
+    path = _unquote(path) if isinstance(path, str) else None
+    msg = _get(obj, MESSAGE_KEYS)
+    event = _get(obj, EVENT_KEYS)
+    text = " ".join(str(v) for v in (event, path, msg) if v)
+    user = _get(obj, USER_KEYS)
+    outcome = _get(obj, OUTCOME_KEYS)
+    return Record("json", text=text or line, ip=_str(_get(obj, IP_KEYS)), status=_int(_get(obj, STATUS_KEYS)),
+                  method=_str(_get(obj, METHOD_KEYS)), path=path, user=_str(user),
+                  event=str(event) if event else None, outcome=str(outcome).lower() if outcome else None)
+
+# ---- nginx / Apache combined ----
+_COMBINED_RE = re.compile(r'^\S+ \S+ \S+ \[[^\]]+\] "')
+
+def _sniff_nginx(line: str) -> bool:
+    return _COMBINED_RE.match(line) is not None
+
+def _parse_nginx(line: str) -> Record | None:
+    """``ip ident user [time] "METHOD path PROTO" status bytes "referer" "ua"`` by fixed splits."""
+    ip, _, rest = line.partition(" ")
+    q1 = rest.find('"')
+    q2 = rest.find('"', q1 + 1)
+    if q1 < 0 or q2 < 0:
+        return None
+    head = rest[:q1].split(" ", 2)
+    user = head[1] if len(head) > 1 and head[1] != "-" else None
+    method, _, target = rest[q1 + 1:q2].partition(" ")
+    path = _unquote(target.rpartition(" ")[0] or target)
+    tail = rest[q2 + 2:q2 + 6]
+    return Record("nginx", text=path, ip=ip, status=_int(tail.strip()), method=method or None,
+                  path=path, user=user)
+
+# ---- syslog (RFC 3164 and 5424) ----
+_SYSLOG_RE = re.compile(r"^(?:<\d{1,3}>)?(?:1 \d{4}-\d\d-\d\dT|[A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d )")
+_USER_RE = re.compile(r"(?:for (?:invalid user )?|user[= ])([\w.@-]+)")
+_AUTH_FAILURE = ("Failed password", "Invalid user", "authentication failure", "FAILED LOGIN")
+
+def _sniff_syslog(line: str) -> bool:
+    return _SYSLOG_RE.match(line) is not None
+
+def _parse_syslog(line: str) -> Record | None:
+    if line.startswith("<"):
+        line = line[line.find(">") + 1:]
+    if line.startswith("1 "):  # RFC 5424: VERSION TIMESTAMP HOST APP PROCID MSGID SD MSG
+        parts = line.split(" ", 7)
+        if len(parts) < 7:
+            return None
+        program, msg = parts[3], parts[7] if len(parts) > 7 else ""
+    else:  # RFC 3164: "Mmm dd hh:mm:ss host prog[pid]: msg"
+        host_prog = line[16:]
+        _, _, rest = host_prog.partition(" ")
+        tag, sep, msg = rest.partition(": ")
+        if not sep:
+            return None
+        program = tag.partition("[")[0]
+    m = _USER_RE.search(msg)
+    outcome = "failure" if any(s in msg for s in _AUTH_FAILURE) else None
+    return Record("syslog", text=msg, user=m.group(1) if m else None, event=program or None, outcome=outcome)
+
+register_format("cloudtrail", _sniff_cloudtrail, _parse_cloudtrail)
+register_format("json", _sniff_json, _parse_json)
+register_format("nginx", _sniff_nginx, _parse_nginx)
+register_format("syslog", _sniff_syslog, _parse_syslog)
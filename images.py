@@ -1,26 +1,157 @@
-# images.py
-import random
+# images.py — asset catalog; each image is uploaded to Slack once and then referenced by file ID
+import hashlib, json, os, random, threading
+from concurrent.futures import Future
 from pathlib import Path
+from typing import Dict, List
 
 # Path to the assets folder relative to this file
 ASSET_DIR = Path(__file__).parent / "assets"
+ASSET_CACHE = os.getenv("ASSET_CACHE", ".slack_assets.json")  # content hash -> uploaded Slack file ID
+
+# Only asset1..asset15 (case-insensitive) with an image extension are attached.
+ALLOWED_NAMES = {f"asset{i}" for i in range(1, 16)}
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".gif")
+COMMENT = "🎲 Random asset attached"
+
+# Slack errors meaning a cached file ID can no longer be referenced.
+STALE_FILE_ERRORS = {"invalid_blocks", "file_not_found", "file_deleted", "invalid_file_id"}
+
+class AssetCatalog:
+    """Attachable images in ``asset_dir``, rescanned only when the directory changes.
+
+    The first card that picks an asset uploads it into its thread with
+    files_upload_v2; the returned file ID is kept in ``cache_path`` and later
+    cards post an image block that points at it instead of sending the bytes
+    again. IDs are keyed by content hash, so renames and redeploys reuse them.
+    """
+
+    def __init__(self, asset_dir: Path = ASSET_DIR, cache_path: str | None = ASSET_CACHE):
+        self.asset_dir = Path(asset_dir)
+        self.cache_path = cache_path
+        self._lock = threading.RLock()  # done-callbacks may fire inline while it is held
+        self._mtime = None
+        self._assets: Dict[Path, str] = {}  # path -> sha256 of its bytes
+        self._ids: Dict[str, str] = self._load()
+        self._uploading: Dict[str, Future] = {}
+        self.uploads = self.reuses = 0
+
+    # ---- catalog ----
+    def _scan(self) -> None:
+        try:
+            mtime = self.asset_dir.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        assets = {}
+        if mtime is not None:
+            for p in sorted(self.asset_dir.iterdir()):
+                if p.stem.lower() in ALLOWED_NAMES and p.suffix.lower() in IMAGE_SUFFIXES and p.is_file():
+                    assets[p] = hashlib.sha256(p.read_bytes()).hexdigest()
+        self._assets, self._mtime = assets, mtime
+
+    def paths(self) -> List[Path]:
+        with self._lock:
+            self._scan()
+            return list(self._assets)
+
+    def pick(self) -> Path | None:
+        paths = self.paths()
+        return random.choice(paths) if paths else None
+
+    # ---- Slack file IDs ----
+    def _load(self) -> Dict[str, str]:
+        if not self.cache_path:
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        if not self.cache_path:
+            return
+        tmp = f"{self.cache_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._ids, f)
+        os.replace(tmp, self.cache_path)
+
+    def file_id(self, path: Path) -> str | None:
+        with self._lock:
+            return self._ids.get(self._assets.get(Path(path), ""))
+
+    def _remember(self, digest: str, f: Future) -> None:
+        with self._lock:
+            self._uploading.pop(digest, None)
+            if f.exception() is not None:
+                return
+            resp = f.result()
+            file_id = (resp.get("file") or {}).get("id") or next((x.get("id") for x in resp.get("files") or []), None)
+            if file_id:
+                self._ids[digest] = file_id
+                self._save()
+
+    def _forget(self, digest: str, file_id: str, f: Future) -> None:
+        resp = getattr(f.exception(), "response", None)
+        if resp is None or resp.get("error") not in STALE_FILE_ERRORS:
+            return
+        with self._lock:
+            if self._ids.get(digest) == file_id:
+                del self._ids[digest]
+                self._save()
+
+    # ---- attach ----
+    def attach(self, delivery, channel: str, thread_ts: str, path: Path | None = None) -> Future | None:
+        """Queue a low-priority image reply in ``thread_ts``; returns the Slack call's future (or None).
+
+        Uploads only if this asset has no file ID yet. While its first upload is
+        in flight, other cards wait for that upload's ID instead of uploading too.
+        """
+        path = Path(path) if path else self.pick()
+        if path is None or not thread_ts:
+            return None
+        with self._lock:
+            self._scan()
+            digest = self._assets.get(path)
+            if digest is None:
+                return None
+            file_id = self._ids.get(digest)
+            pending = self._uploading.get(digest)
+            if file_id is None and pending is None:
+                self.uploads += 1
+                upload = delivery.submit("files_upload_v2", "low", channel=channel, file=str(path),
+                                         filename=path.name, initial_comment=COMMENT, thread_ts=thread_ts)
+                self._uploading[digest] = upload
+                upload.add_done_callback(lambda f: self._remember(digest, f))
+                return upload
+        if file_id is None:  # reuse the upload in flight once it has an ID
+            done = Future()
+            def chained(_):
+                fid = self.file_id(path)
+                if fid is None:
+                    done.set_result(None)
+                else:
+                    self._reference(delivery, channel, thread_ts, path, digest, fid).add_done_callback(
+                        lambda f: done.set_exception(f.exception()) if f.exception() else done.set_result(f.result()))
+            pending.add_done_callback(chained)
+            return done
+        return self._reference(delivery, channel, thread_ts, path, digest, file_id)
+
+    def _reference(self, delivery, channel: str, thread_ts: str, path: Path, digest: str, file_id: str) -> Future:
+        with self._lock:
+            self.reuses += 1
+        blocks = [{"type": "image", "slack_file": {"id": file_id}, "alt_text": path.stem}]
+        posted = delivery.submit("chat_postMessage", "low", channel=channel, thread_ts=thread_ts, text=COMMENT, blocks=blocks)
+        posted.add_done_callback(lambda f: self._forget(digest, file_id, f))
+        return posted
+
+CATALOG = AssetCatalog()
 
 def pick_random_image() -> str | None:
     """
     Return the absolute path of a random file named asset1..asset15
     inside the assets/ folder. Returns None if none found.
     """
-    if not ASSET_DIR.exists():
-        return None
-
-    # Only allow asset1..asset15 (case-insensitive)
-    allowed_names = {f"asset{i}" for i in range(1, 16)}  # asset1..asset15
-    imgs = []
-    for p in ASSET_DIR.iterdir():
-        stem = p.stem.lower()  # filename without extension
-        if stem in allowed_names and p.suffix.lower() in (".png", ".jpg", ".jpeg", ".gif"):
-            imgs.append(p)
-
-    if not imgs:
-        return None
-    return str(random.choice(imgs))
+    p = CATALOG.pick()
+    return str(p) if p else None
@@ -0,0 +1,228 @@
+# incidents.py — SQLite (WAL) incident store: card state, button actions and their history
+import os, queue, sqlite3, threading, time
+from typing import Dict, List, Tuple
+
+INCIDENT_DB = os.getenv("INCIDENT_DB", "")                                # SQLite path; unset disables the store
+INCIDENT_BATCH_MAX = int(os.getenv("INCIDENT_BATCH_MAX", "500"))          # writes committed per transaction
+INCIDENT_LOOKBACK_S = float(os.getenv("INCIDENT_LOOKBACK_S", "3600"))     # history consulted for new alerts
+INCIDENT_ESCALATE_AFTER = int(os.getenv("INCIDENT_ESCALATE_AFTER", "3"))  # distinct open incidents per IP that escalate the next
+INCIDENT_EXPIRE_EVERY_S = float(os.getenv("INCIDENT_EXPIRE_EVERY_S", "60"))  # how often idle open incidents are expired
+
+ACTIONS = {"escalate": "escalated", "ack": "acknowledged", "lower": "lowered"}  # button value -> status
+QUIET_STATUSES = ("acknowledged", "lowered")  # repeats of these are folded in, not posted
+LOWER_SEVERITY = "CASE severity WHEN 'critical' THEN 'high' WHEN 'high' THEN 'medium' ELSE 'low' END"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS incidents (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    fingerprint TEXT,
+    ip TEXT,
+    category TEXT,
+    severity TEXT,
+    rule TEXT,
+    status TEXT NOT NULL DEFAULT 'open',
+    count INTEGER NOT NULL DEFAULT 1,
+    opened REAL NOT NULL,
+    updated REAL NOT NULL,
+    UNIQUE (channel, ts)
+);
+CREATE INDEX IF NOT EXISTS incidents_fingerprint ON incidents (fingerprint, opened);
+CREATE INDEX IF NOT EXISTS incidents_ip ON incidents (ip, opened);
+CREATE INDEX IF NOT EXISTS incidents_status ON incidents (status, updated);
+CREATE TABLE IF NOT EXISTS incident_events (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    at REAL NOT NULL,
+    action TEXT NOT NULL,
+    user TEXT
+);
+CREATE INDEX IF NOT EXISTS incident_events_card ON incident_events (channel, ts, at);
+"""
+
+class IncidentStore:
+    """One row per posted card (keyed by channel/ts) plus an append-only log of what happened to it.
+
+    Writes only enqueue a statement, so a button click returns in microseconds;
+    a background writer commits whatever has queued up in one transaction.
+    Reads use a per-thread connection and, thanks to WAL, never wait on the
+    writer; they see a write once its batch commits (normally within a few ms).
+    The writer also expires open incidents that saw no activity for ``idle_s``.
+    """
+
+    def __init__(self, path: str, batch_max: int = INCIDENT_BATCH_MAX, idle_s: float = INCIDENT_LOOKBACK_S,
+                 expire_every: float = INCIDENT_EXPIRE_EVERY_S, clock=time.time):
+        self.path = path
+        self.batch_max = batch_max
+        self.idle_s = idle_s
+        self.expire_every = expire_every
+        self.clock = clock
+        self._q: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._local = threading.local()
+        self._writer: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.written = self.batches = self.failed = 0
+        db = self._connect()
+        db.executescript(SCHEMA)
+        db.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")  # WAL stays consistent; only the last batch is at risk on power loss
+        db.row_factory = sqlite3.Row
+        return db
+
+    # ---- writer ----
+    def start(self) -> None:
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name="incident-writer", daemon=True)
+                self._writer.start()
+
+    def stop(self) -> None:
+        """Commit everything queued so far and stop the writer."""
+        if self._writer is not None:
+            self._q.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Block until every write queued before this call is committed."""
+        done = threading.Event()
+        self._q.put(done)
+        return done.wait(timeout)
+
+    def _run(self) -> None:
+        db = self._connect()
+        running = True
+        expired_at = time.monotonic()
+        while running:
+            if time.monotonic() - expired_at >= self.expire_every:
+                expired_at = time.monotonic()
+                self.expire()
+            try:
+                batch = [self._q.get(timeout=self.expire_every)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_max:  # group-commit whatever piled up meanwhile
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            writes = [w for w in batch if isinstance(w, tuple)]
+            if writes:
+                try:
+                    with db:
+                        for sql, params in writes:
+                            db.execute(sql, params)
+                    self.written += len(writes)
+                    self.batches += 1
+                except sqlite3.Error as e:
+                    self.failed += len(writes)
+                    print("⚠️ Incident store write failed:", repr(e))
+            for w in batch:
+                if w is None:
+                    running = False
+                elif isinstance(w, threading.Event):
+                    w.set()
+        db.close()
+
+    def _write(self, sql: str, params: Tuple) -> None:
+        self._q.put((sql, params))
+
+    # ---- writes ----
+    def opened(self, channel: str, ts: str, fingerprint: str | None = None, ip: str | None = None,
+               category: str | None = None, severity: str | None = None, rule: str | None = None,
+               status: str = "open") -> None:
+        now = self.clock()
+        self._write(
+            "INSERT INTO incidents (channel, ts, fingerprint, ip, category, severity, rule, status, opened, updated)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (channel, ts) DO UPDATE SET"
+            " fingerprint = excluded.fingerprint, ip = excluded.ip, category = excluded.category,"
+            " severity = excluded.severity, rule = excluded.rule, updated = excluded.updated",
+            (channel, ts, fingerprint, ip, category, severity, rule, status, now, now))
+        self._write("INSERT INTO incident_events (channel, ts, at, action) VALUES (?, ?, ?, ?)", (channel, ts, now, status))
+
+    def act(self, channel: str, ts: str, action: str, user: str | None = None) -> str:
+        """Record a button click (``escalate`` / ``ack`` / ``lower``) on the card at channel/ts; returns the new status."""
+        status = ACTIONS[action]
+        now = self.clock()
+        severity = f", severity = {LOWER_SEVERITY}" if action == "lower" else ""
+        self._write(
+            "INSERT INTO incidents (channel, ts, status, opened, updated) VALUES (?, ?, ?, ?, ?)"
+            f" ON CONFLICT (channel, ts) DO UPDATE SET status = excluded.status, updated = excluded.updated{severity}",
+            (channel, ts, status, now, now))
+        self._write("INSERT INTO incident_events (channel, ts, at, action, user) VALUES (?, ?, ?, ?, ?)",
+                    (channel, ts, now, action, user))
+        return status
+
+    def repeat(self, channel: str, ts: str) -> None:
+        """Fold a suppressed duplicate into an existing incident."""
+        self._write("UPDATE incidents SET count = count + 1, updated = ? WHERE channel = ? AND ts = ?",
+                    (self.clock(), channel, ts))
+
+    def expire(self) -> None:
+        """Mark open incidents untouched for ``idle_s`` as expired, so they stop counting towards escalation."""
+        now = self.clock()
+        self._write("INSERT INTO incident_events (channel, ts, at, action)"
+                    " SELECT channel, ts, ?, 'expired' FROM incidents WHERE status = 'open' AND updated < ?",
+                    (now, now - self.idle_s))
+        self._write("UPDATE incidents SET status = 'expired', updated = ? WHERE status = 'open' AND updated < ?",
+                    (now, now - self.idle_s))
+
+    # ---- reads ----
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = self._connect()
+        return db
+
+    def _rows(self, sql: str, params: Tuple) -> List[Dict]:
+        return [dict(r) for r in self._db().execute(sql, params).fetchall()]
+
+    def get(self, channel: str, ts: str) -> Dict | None:
+        rows = self._rows("SELECT * FROM incidents WHERE channel = ? AND ts = ?", (channel, ts))
+        return rows[0] if rows else None
+
+    def latest(self, fingerprint: str, since_s: float = INCIDENT_LOOKBACK_S) -> Dict | None:
+        rows = self._rows("SELECT * FROM incidents WHERE fingerprint = ? AND opened >= ? ORDER BY opened DESC LIMIT 1",
+                          (fingerprint, self.clock() - since_s))
+        return rows[0] if rows else None
+
+    def open_for_ip(self, ip: str, since_s: float = INCIDENT_LOOKBACK_S) -> List[Dict]:
+        """Incidents for ``ip`` still in status 'open' and opened within the last ``since_s`` seconds, newest first."""
+        return self._rows("SELECT * FROM incidents WHERE ip = ? AND opened >= ? AND status = 'open' ORDER BY opened DESC",
+                          (ip, self.clock() - since_s))
+
+    def by_status(self, status: str, limit: int = 100) -> List[Dict]:
+        return self._rows("SELECT * FROM incidents WHERE status = ? ORDER BY updated DESC LIMIT ?", (status, limit))
+
+    def history(self, channel: str, ts: str) -> List[Dict]:
+        return self._rows("SELECT at, action, user FROM incident_events WHERE channel = ? AND ts = ? ORDER BY at, id",
+                          (channel, ts))
+
+    def verdict(self, fingerprint: str, ip: str | None, since_s: float = INCIDENT_LOOKBACK_S) -> Tuple[str, Dict | None, str | None]:
+        """How to treat a new alert given recent history: ("post" | "escalate" | "suppress", related incident, note).
+
+        Repeats of an acknowledged or lowered incident are suppressed; repeats of an
+        escalated one, or an IP that already has open incidents for
+        INCIDENT_ESCALATE_AFTER distinct fingerprints, are escalated. Alerts posted
+        as escalations don't count as open, so one noisy IP can't escalate forever.
+        """
+        last = self.latest(fingerprint, since_s)
+        if last and last["status"] in QUIET_STATUSES:
+            return "suppress", last, None
+        if last and last["status"] == "escalated":
+            return "escalate", last, f"🚨 Repeat of an escalated incident (first seen {time.strftime('%H:%M', time.localtime(last['opened']))})"
+        if ip:
+            open_ = self.open_for_ip(ip, since_s)
+            distinct = len({r["fingerprint"] for r in open_})
+            if distinct >= INCIDENT_ESCALATE_AFTER:
+                return "escalate", open_[0], f"🚨 `{ip}` already has {distinct} open incidents in the last {since_s / 60:.0f} min"
+        return "post", last, None
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self._q.qsize(), "written": self.written, "batches": self.batches, "failed": self.failed}
@@ -1,6 +1,9 @@
-import os, json
-from typing import List
+import hashlib, json, os, sqlite3, threading, time
+from collections import OrderedDict
+from typing import Dict, List
 from schemas import TriageResult
+from metrics import LLM_CACHE, stage
+from resilience import COHERE_BREAKER, COHERE_CHAT_TIMEOUT_S, cohere_client, request_options
 
 try:
     import cohere
@@ -9,6 +12,10 @@ except Exception:
 
 MOCK_MODE = os.getenv("MOCK_MODE", "true").lower() == "true"
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")
+LLM_MODEL = os.getenv("LLM_MODEL", "command-r-plus")
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", "3600"))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB")  # optional SQLite file; cache survives restarts when set
 
 SYSTEM = (
     "You are a security triage assistant. "
@@ -23,6 +30,73 @@ PROMPT_TEMPLATE = (
     "Now produce JSON with fields: severity (low|medium|high|critical), category, summary, recommended_actions (list of 3-5), needs_human_review (bool), confidence (0-1), evidence (list of short strings)."
 )
 
+PROMPT_VERSION = "1"  # bump whenever SYSTEM or PROMPT_TEMPLATE changes meaningfully
+
+def cache_key(summary: str, baseline: str, evidence: List[str], model: str = LLM_MODEL) -> str:
+    blob = json.dumps([summary, baseline, evidence, model, PROMPT_VERSION], ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class TriageCache:
+    """LRU + TTL cache of LLM triage results, optionally backed by a SQLite file."""
+
+    def __init__(self, size: int = LLM_CACHE_SIZE, ttl: float = LLM_CACHE_TTL_S, db_path: str | None = LLM_CACHE_DB,
+                 clock=time.time):
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self._mem: OrderedDict[str, tuple[float, TriageResult]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = self.disk_hits = self.misses = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, created REAL, result TEXT)")
+            self._db.execute("DELETE FROM llm_cache WHERE created < ?", (clock() - ttl,))
+
+    def get(self, key: str) -> TriageResult | None:
+        now = self.clock()
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit and now - hit[0] < self.ttl:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                LLM_CACHE.inc(result="hit")
+                return hit[1].model_copy(deep=True)
+            if hit:
+                del self._mem[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT created, result FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row and now - row[0] < self.ttl:
+                    result = TriageResult.model_validate_json(row[1])
+                    self._remember(key, row[0], result)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    LLM_CACHE.inc(result="disk_hit")
+                    return result.model_copy(deep=True)
+            self.misses += 1
+            LLM_CACHE.inc(result="miss")
+            return None
+
+    def put(self, key: str, result: TriageResult) -> None:
+        now = self.clock()
+        with self._lock:
+            self._remember(key, now, result.model_copy(deep=True))
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO llm_cache (key, created, result) VALUES (?, ?, ?)",
+                                 (key, now, result.model_dump_json()))
+
+    def _remember(self, key: str, created: float, result: TriageResult) -> None:
+        self._mem[key] = (created, result)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.size:
+            self._mem.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "entries": len(self._mem)}
+
+CACHE = TriageCache()
+
 def _mock_result(summary: str, baseline: str, evidence: List[str]) -> TriageResult:
     sev = "high" if baseline in {"high", "critical"} else "medium"
     category = "auth" if "failed_logins" in summary else ("injection" if "suspicious_paths" in summary else "other")
@@ -44,16 +118,25 @@ def triage_with_llm(summary: str, baseline: str, evidence_snippets: List[str]) -
     if MOCK_MODE or not (cohere and COHERE_API_KEY):
         return _mock_result(summary, baseline, evidence_snippets)
 
-    co = cohere.Client(COHERE_API_KEY)
+    key = cache_key(summary, baseline, evidence_snippets)
+    cached = CACHE.get(key)
+    if cached is not None:
+        return cached
+
     evidence_blob = "\n---\n".join(evidence_snippets)
     prompt = PROMPT_TEMPLATE.format(summary=summary, baseline=baseline, evidence=evidence_blob)
 
-    resp = co.chat(
-        model="command-r-plus",
-        message=prompt,
-        preamble=SYSTEM,
-        temperature=0.2,
-    )
+    with stage("llm"):
+        resp = COHERE_BREAKER.call(
+            cohere_client().chat,
+            model=LLM_MODEL,
+            message=prompt,
+            preamble=SYSTEM,
+            temperature=0.2,
+            request_options=request_options(COHERE_CHAT_TIMEOUT_S),
+        )
     text = resp.text.strip()
     data = json.loads(text)
-    return TriageResult(**data)
+    result = TriageResult(**data)
+    CACHE.put(key, result)
+    return result
@@ -1,7 +1,8 @@
-import threading, os
-# from slack_bolt.adapter.socket_mode import SocketModeHandler
+# main.py — run the Slack app and the HTTP ingest API in one process.
+# Both import the same pipeline.get_pipeline() instance, so the KB index,
+# LLM cache, Slack delivery queue, dedup windows and workers are shared.
+import sys, threading
 from dotenv import load_dotenv
-from app import app as bolt_app
 import uvicorn
 
 load_dotenv()
@@ -34,16 +35,19 @@ def demo_blocks(tr):
     ]
     return blocks
 
-def run_slack():
-    SocketModeHandler(bolt_app, os.getenv("SLACK_APP_TOKEN")).start()
-
 def run_http():
-    uvicorn.run("server:api", host="0.0.0.0", port=8080, reload=False)
+    from server import api
+    uvicorn.run(api, host="0.0.0.0", port=8080, reload=False)
+
+def run_all():
+    from app import run_slack
+    threading.Thread(target=run_slack, daemon=True).start()
+    run_http()
 
 
 from types import SimpleNamespace
 
-if __name__ == "__main__":
+def print_demo_card():
     # make a fake triage result
     fake_tr = SimpleNamespace(
         severity="critical",
@@ -67,7 +71,8 @@ if __name__ == "__main__":
     import json
     print(json.dumps(blocks, indent=2))
 
-# if __name__ == "__main__":
-#     t1 = threading.Thread(target=run_slack, daemon=True)
-#     t1.start()
-#     run_http()
+if __name__ == "__main__":
+    if "--demo-card" in sys.argv:
+        print_demo_card()
+    else:
+        run_all()
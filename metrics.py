@@ -0,0 +1,203 @@
+# metrics.py — per-stage latency histograms, counters and Prometheus text exposition
+import os, random, threading, time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+try:
+    from pyinstrument import Profiler  # optional sampling profiler
+except Exception:
+    Profiler = None
+
+PROFILE_STAGES = {s for s in os.getenv("PROFILE_STAGES", "").split(",") if s}  # e.g. "parse,llm"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))          # share of stage runs profiled
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_REGISTRY: List["_Metric"] = []
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self.samples())
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, n: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {v:g}" for k, v in items]
+
+class Gauge(_Metric):
+    """Read at scrape time from ``fn() -> value`` or ``fn() -> {label tuple: value}``."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def samples(self) -> List[str]:
+        try:
+            v = self.fn()
+        except Exception:
+            return []
+        if isinstance(v, dict):
+            return [f"{self.name}{_labels(self.labelnames, k)} {float(x):g}" for k, x in sorted(v.items())]
+        return [f"{self.name} {float(v):g}"]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # bucket counts..., +Inf count, sum
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[i] += 1
+                    break
+            else:
+                s[len(self.buckets)] += 1
+            s[-1] += value
+
+    def count(self, **labels) -> int:
+        s = self._series.get(self._key(labels))
+        return int(sum(s[:-1])) if s else 0
+
+    def samples(self) -> List[str]:
+        out = []
+        with self._lock:
+            items = sorted((k, list(s)) for k, s in self._series.items())
+        for key, s in items:
+            cum = 0.0
+            for b, c in zip(self.buckets + (float("inf"),), s[:-1]):
+                cum += c
+                le = 'le="+Inf"' if b == float("inf") else f'le="{b:g}"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cum:g}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {s[-1]:.6f}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {cum:g}")
+        return out
+
+def render() -> str:
+    """Every registered metric in the Prometheus text format (0.0.4)."""
+    return "\n".join(m.render() for m in _REGISTRY) + "\n"
+
+STAGE_SECONDS = Histogram("triageo_stage_seconds", "Wall time per pipeline stage.", ["stage"])
+FALLBACKS = Counter("triageo_fallbacks_total", "Degraded results by kind (demo_blocks, heuristic_card, bm25_only, retrieval_skipped).", ["kind"])
+LLM_CACHE = Counter("triageo_llm_cache_total", "LLM triage cache lookups.", ["result"])
+SLACK_ERRORS = Counter("triageo_slack_errors_total", "Slack API failures (retried or final) by method and error.", ["method", "error"])
+
+# ---- stage timing ----
+def observe(stage_name: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage_name)
+
+def _profile_path(stage_name: str, ext: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    return os.path.join(PROFILE_DIR, f"{stage_name}-{time.strftime('%Y%m%d-%H%M%S')}-{time.perf_counter_ns() % 10**6:06d}.{ext}")
+
+@contextmanager
+def _profiled(stage_name: str) -> Iterator[None]:
+    """Profile this run of the stage: pyinstrument (sampling) if installed, else cProfile."""
+    if Profiler is not None:
+        prof = Profiler(interval=0.001)
+        prof.start()
+        try:
+            yield
+        finally:
+            prof.stop()
+            with open(_profile_path(stage_name, "txt"), "w", encoding="utf-8") as f:
+                f.write(prof.output_text(unicode=True))
+        return
+    import cProfile
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        prof.dump_stats(_profile_path(stage_name, "prof"))
+
+@contextmanager
+def stage(stage_name: str) -> Iterator[None]:
+    """Time the block into triageo_stage_seconds{stage=...}; sampled runs of PROFILE_STAGES are profiled too."""
+    profile = stage_name in PROFILE_STAGES and random.random() < PROFILE_SAMPLE_RATE
+    t = time.perf_counter()
+    try:
+        if profile:
+            with _profiled(stage_name):
+                yield
+        else:
+            yield
+    finally:
+        observe(stage_name, time.perf_counter() - t)
+
+def timed(stage_name: str):
+    """Decorator form of ``stage``."""
+    def wrap(fn):
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            with stage(stage_name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+class TimedIter:
+    """Wraps an iterable and adds up the time spent waiting on it (e.g. a network download)."""
+
+    def __init__(self, it: Iterable):
+        self._it = iter(it)
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        t = time.perf_counter()
+        try:
+            return next(self._it)
+        finally:
+            self.seconds += time.perf_counter() - t
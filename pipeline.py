@@ -0,0 +1,365 @@
+# pipeline.py — one warm triage pipeline shared by the Slack app and the HTTP ingest API
+import os, sqlite3, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Iterable, List, Tuple
+
+from dedup import AlertAggregator, parsed_category, parsed_fingerprint
+from delivery import PooledWebClient, SlackDelivery
+from incidents import INCIDENT_DB, IncidentStore
+from metrics import FALLBACKS, Gauge, TimedIter, observe, stage
+from resilience import COHERE_BREAKER, Deadline, run_bounded
+from workers import WorkQueue
+
+try:
+    import rag
+    import llm
+    from triage import ENGINE, parse_log, parse_stream, baseline_severity, summarize
+    from blockkit import triage_blocks
+    from schemas import TriageResult
+except Exception:
+    # Demo mode can run without the AI stack (numpy, cohere, ...).
+    rag = llm = ENGINE = None
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+INGEST_QUEUE_MAX = int(os.getenv("INGEST_QUEUE_MAX", "1000"))
+KB_REFRESH_S = float(os.getenv("KB_REFRESH_S", "30"))  # how often alerts re-check the KB for edits
+STAGE_WORKERS = int(os.getenv("STAGE_WORKERS", "16"))
+SEARCH_BUDGET_S = float(os.getenv("SEARCH_BUDGET_S", "2"))     # embed + search; past it, triage runs without KB evidence
+LLM_BUDGET_S = float(os.getenv("LLM_BUDGET_S", "20"))          # past it the heuristic card stays up
+FIRST_CARD_S = float(os.getenv("FIRST_CARD_S", "1.5"))         # max wait before the heuristic card is posted
+
+HEURISTIC_CATEGORY = {"failed_login": "auth", "suspicious_path": "injection",
+                      "server_error": "other", "llm_prompt_injection": "llm_misuse"}
+HEURISTIC_ACTIONS = {
+    "auth": ["Block abusive IP", "Enforce MFA; lock targeted accounts", "Review IAM / auth events"],
+    "injection": ["Block source IP", "Check the probed paths for exposure", "Review DB and WAF logs"],
+    "llm_misuse": ["Review the prompts and tool calls involved", "Check for data exfiltration", "Tighten LLM tool permissions"],
+    "other": ["Review recent deploys and upstream health", "Check the error samples", "Watch the error rate"],
+}
+
+def _note(text: str) -> dict:
+    return {"type": "context", "elements": [{"type": "mrkdwn", "text": text}]}
+
+class TriagePipeline:
+    """Long-lived parse → baseline → summarize → search → LLM → blocks → Slack chain.
+
+    Owns the warm resources both entry points share: the resident KB index,
+    the compiled scan engine, the LLM result cache and client, the pooled
+    Slack client with its delivery queue, the dedup windows, the incident
+    store, and the triage worker pool. Use ``get_pipeline()`` so the Bolt app and FastAPI share one.
+    """
+
+    def __init__(self, token: str | None = None, channel: str | None = None,
+                 workers: int = INGEST_WORKERS, queue_max: int = INGEST_QUEUE_MAX):
+        self.channel = channel
+        self.engine = ENGINE
+        self.index = rag.INDEX if rag else None
+        self.llm_cache = llm.CACHE if llm else None
+        self.client = PooledWebClient(token=token)
+        self.delivery = SlackDelivery(self.client)
+        self.dedup = AlertAggregator(self.delivery.lane("medium"))
+        self.jobs = WorkQueue(self._run_job, workers=workers, maxsize=queue_max, name="triage")
+        # Orchestration tasks wait on provider calls, never the reverse, so the two pools can't deadlock.
+        self.stages = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="stage")
+        self.calls = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="call")
+        self.breaker = COHERE_BREAKER
+        self.incidents = None
+        if INCIDENT_DB:
+            try:
+                self.incidents = IncidentStore(INCIDENT_DB)
+            except sqlite3.Error as e:
+                print("⚠️ Incident store unavailable:", repr(e))
+        self._kb_checked = 0.0
+        self._lock = threading.Lock()
+        self._started = False
+
+    @property
+    def ai_ready(self) -> bool:
+        return rag is not None
+
+    # ---- lifecycle ----
+    def start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.warm()
+        self.delivery.start()
+        self.dedup.start()
+        if self.incidents is not None:
+            self.incidents.start()
+        self.jobs.start()
+
+    def stop(self) -> None:
+        self.jobs.stop()
+        self.delivery.stop()
+        if self.incidents is not None:
+            self.incidents.stop()
+        self.stages.shutdown(wait=False, cancel_futures=True)
+        self.calls.shutdown(wait=False, cancel_futures=True)
+
+    def warm(self) -> None:
+        """Build/refresh the KB index and load it, so the first alert pays no setup cost."""
+        if not self.ai_ready:
+            return
+        try:
+            rag.build_index()
+            self.index.refresh()
+            self._kb_checked = time.monotonic()
+        except Exception as e:
+            print("⚠️ KB warm-up failed:", repr(e))
+
+    def _maybe_refresh_kb(self) -> None:
+        if time.monotonic() - self._kb_checked >= KB_REFRESH_S:
+            self._kb_checked = time.monotonic()
+            rag.build_index()  # no-op unless KB files changed
+
+    # ---- stages ----
+    def parse(self, text: str):
+        with stage("parse"):
+            return parse_log(text)
+
+    def parse_lines(self, lines: Iterable[str | bytes]):
+        """parse_stream, with time blocked on ``lines`` (e.g. the file download) timed separately."""
+        src = TimedIter(lines)
+        t = time.perf_counter()
+        try:
+            return parse_stream(src)
+        finally:
+            observe("download", src.seconds)
+            observe("parse", time.perf_counter() - t - src.seconds)
+
+    def retrieve(self, summaries: List[str], budget: float = SEARCH_BUDGET_S) -> List[List[str]]:
+        """KB evidence per summary from one batched search; empty evidence if it overruns ``budget``."""
+        def search():
+            self._maybe_refresh_kb()
+            return rag.search_many(summaries, k=3)
+        try:
+            hits = run_bounded(self.calls, budget, search)
+        except Exception as e:
+            print("⚠️ Retrieval skipped:", repr(e))
+            FALLBACKS.inc(kind="retrieval_skipped")
+            return [[] for _ in summaries]
+        return [[d["text"] for d in docs] for docs in hits]
+
+    def contexts(self, parsed_list: List[dict]) -> List[Tuple[str, str, List[str]]]:
+        """(baseline, summary, evidence snippets) per parse result, from one batched retrieval pass."""
+        bases = [baseline_severity(p) for p in parsed_list]
+        summaries = [summarize(p) for p in parsed_list]
+        return list(zip(bases, summaries, self.retrieve(summaries)))
+
+    def triage(self, baseline: str, summary: str, evidence: List[str], budget: float = LLM_BUDGET_S):
+        return run_bounded(self.calls, budget, llm.triage_with_llm,
+                           summary=summary, baseline=baseline, evidence_snippets=evidence)
+
+    def triage_many(self, parsed_list: List[dict]) -> List:
+        return [self.triage(*ctx) for ctx in self.contexts(parsed_list)]
+
+    def heuristic(self, parsed: dict, baseline: str) -> "TriageResult":
+        """Card content from the parse alone, available without any provider call."""
+        counts = parsed["counts"]
+        top = max(counts, key=counts.get) if any(counts.values()) else None
+        category = HEURISTIC_CATEGORY.get(top, "other")
+        return TriageResult(
+            severity=baseline,
+            category=category,
+            summary=f"Heuristic triage: {summarize(parsed)}",
+            recommended_actions=HEURISTIC_ACTIONS[category],
+            needs_human_review=True,
+            confidence=0.5,
+            evidence=parsed["samples"][:3],
+        )
+
+    def render(self, parsed: dict) -> List[dict]:
+        blocks = triage_blocks(self.triage_many([parsed])[0], parsed)
+        if not blocks:
+            raise ValueError("triage_blocks returned empty")
+        return blocks
+
+    def _full_blocks(self, parsed: dict, baseline: str, summary: str, evidence: Future | None) -> List[dict]:
+        deadline = Deadline(SEARCH_BUDGET_S + LLM_BUDGET_S)
+        if evidence is None:
+            snippets = self.retrieve([summary], deadline.cap(SEARCH_BUDGET_S))[0]
+        else:  # a slice of a shared batched retrieval
+            try:
+                snippets = evidence.result(timeout=deadline.cap(SEARCH_BUDGET_S))
+            except FutureTimeout:
+                snippets = []
+        return triage_blocks(self.triage(baseline, summary, snippets, deadline.cap(LLM_BUDGET_S)), parsed)
+
+    def start_triage(self, parsed: dict, evidence: Future | None = None) -> Future | None:
+        """Run retrieval + LLM for ``parsed`` on the stage pool; None while the Cohere circuit is open."""
+        if self.breaker.state == "open":
+            return None
+        return self.stages.submit(self._full_blocks, parsed, baseline_severity(parsed), summarize(parsed), evidence)
+
+    def first_card(self, parsed: dict, full: Future | None, wait: float = FIRST_CARD_S) -> Tuple[List[dict], Future | None]:
+        """Blocks to post now, plus a future of the card that replaces them (or None).
+
+        If ``full`` (from ``start_triage``) finishes within ``wait`` seconds its
+        card is returned directly; otherwise the heuristic card goes out first
+        and the future resolves to the LLM card, or to a final heuristic card
+        if the LLM stage fails. Without ``full`` the heuristic card is final.
+        """
+        def heuristic(note: str) -> List[dict]:
+            FALLBACKS.inc(kind="heuristic_card")
+            return triage_blocks(self.heuristic(parsed, baseline_severity(parsed)), parsed) + [_note(note)]
+        unavailable = "⚠️ LLM triage unavailable; heuristic result shown."
+        if full is not None:
+            try:
+                return full.result(timeout=wait), None
+            except FutureTimeout:
+                later = Future()
+                def settle(f):
+                    if f.exception() is None:
+                        later.set_result(f.result())
+                    else:
+                        print("⚠️ LLM triage failed after the heuristic card:", repr(f.exception()))
+                        later.set_result(heuristic(unavailable))
+                full.add_done_callback(settle)
+                return heuristic("⏳ LLM triage pending; this card updates in place."), later
+            except Exception as e:
+                print("⚠️ LLM triage failed, posting heuristic card:", repr(e))
+        return heuristic(unavailable), None
+
+    def follow_up(self, channel: str, posted, later: Future | None, fp: str | None = None) -> None:
+        """Once ``later`` resolves, replace the posted card (``posted``: its ts, or a future of the post)."""
+        if later is None:
+            return
+        if isinstance(posted, Future):
+            posted.add_done_callback(lambda f: f.exception() is None and self.follow_up(channel, f.result().get("ts"), later, fp))
+            return
+        if posted:
+            later.add_done_callback(lambda f: self._replace_card(channel, posted, f, fp))
+
+    def _replace_card(self, channel: str, ts: str, f: Future, fp: str | None) -> None:
+        blocks = f.result()
+        if fp is not None and self.dedup.revise(channel, fp, ts, blocks):
+            return
+        self.delivery.submit("chat_update", "medium", channel=channel, ts=ts, text="🔔 Triageo alert", blocks=blocks)
+
+    # ---- incident history ----
+    def screen(self, fp: str, ip: str | None) -> Tuple[str, str | None]:
+        """("post" | "escalate" | "suppress", note) for a claimed alert, from recent incidents.
+
+        A suppressed alert is counted on the incident it repeats.
+        """
+        if self.incidents is None:
+            return "post", None
+        try:
+            verdict, incident, note = self.incidents.verdict(fp, ip)
+        except sqlite3.Error as e:
+            print("⚠️ Incident lookup failed:", repr(e))
+            return "post", None
+        if verdict == "suppress":
+            self.incidents.repeat(incident["channel"], incident["ts"])
+        return verdict, note
+
+    def record(self, channel: str, ts: str | None, fp: str, **meta) -> None:
+        """Open an incident for a posted card (``meta``: ip, category, severity, rule, status)."""
+        if self.incidents is not None and ts:
+            self.incidents.opened(channel, ts, fp, **meta)
+
+    def flag(self, blocks: List[dict], later: Future | None, note: str | None) -> Tuple[List[dict], Future | None]:
+        """Append ``note`` to a card and to the card that will replace it."""
+        if not note:
+            return blocks, later
+        if later is not None:
+            flagged = Future()
+            def settle(f):
+                if f.exception() is None:
+                    flagged.set_result(f.result() + [_note(note)])
+                else:
+                    flagged.set_exception(f.exception())
+            later.add_done_callback(settle)
+            later = flagged
+        return blocks + [_note(note)], later
+
+    # ---- delivery ----
+    def post_async(self, channel: str, blocks: List[dict], priority: str = "medium", fp: str | None = None,
+                   incident: dict | None = None):
+        """Queue a card; when ``fp`` is given the posted ts is registered with the dedup window
+        and, with ``incident`` metadata, recorded in the incident store."""
+        posted = self.delivery.submit("chat_postMessage", priority, channel=channel, text="🔔 Triageo alert", blocks=blocks)
+        if fp is not None:
+            posted.add_done_callback(lambda f: self._card_posted(channel, fp, blocks, f, incident))
+        return posted
+
+    def _card_posted(self, channel: str, fp: str, blocks: List[dict], f, incident: dict | None = None) -> None:
+        if f.exception() is not None:
+            self.dedup.release(channel, fp)
+        else:
+            ts = f.result().get("ts")
+            self.dedup.opened(channel, fp, ts, blocks)
+            if incident is not None:
+                self.record(channel, ts, fp, **incident)
+
+    # ---- jobs ----
+    def submit(self, job: dict | Callable[[], None]) -> bool:
+        """Queue a triage job (``{"text": ...}`` or ``{"texts": [...]}``) or a callable for the workers."""
+        return self.jobs.submit(job)
+
+    def _run_job(self, job: dict | Callable[[], None]) -> None:
+        if callable(job):
+            job()
+        elif "texts" in job:
+            self.triage_batch_to_slack(**job)
+        else:
+            self.triage_batch_to_slack([job["text"]], job.get("channel"), [job.get("rule")])
+
+    def triage_batch_to_slack(self, texts: List[str], channel: str | None = None, rules: List[str | None] | None = None):
+        """Triage several events together: one embedding/search pass, then one card per event.
+
+        Events whose fingerprint already has an open card only bump that card's counter;
+        repeats of acknowledged incidents are dropped and repeats of escalated ones escalated.
+        """
+        channel = channel or self.channel
+        rules = rules or [None] * len(texts)
+        todo = []
+        for text, rule in zip(texts, rules):
+            p = self.parse(text)
+            baseline = baseline_severity(p)
+            fp = parsed_fingerprint(p, baseline, rule)
+            if not self.dedup.claim(channel, fp):
+                continue
+            verdict, note = self.screen(fp, p.get("top_ip"))
+            if verdict == "suppress":
+                self.dedup.release(channel, fp)
+                continue
+            incident = {"ip": p.get("top_ip"), "category": parsed_category(p), "severity": baseline, "rule": rule,
+                        "status": "escalated" if verdict == "escalate" else "open"}
+            todo.append((p, baseline, fp, note, incident))
+        if not todo:
+            return
+        retrieval = self.stages.submit(self.retrieve, [summarize(p) for p, *_ in todo])
+        started = []
+        for i, (p, *_) in enumerate(todo):
+            evidence = Future()
+            retrieval.add_done_callback(lambda f, i=i, ev=evidence: ev.set_result(f.result()[i]))
+            started.append(self.start_triage(p, evidence))
+        deadline = Deadline(FIRST_CARD_S)  # one wait for the whole batch, not one per event
+        for (p, baseline, fp, note, incident), full in zip(todo, started):
+            try:
+                blocks, later = self.flag(*self.first_card(p, full, deadline.remaining()), note)
+                priority = "critical" if note else baseline
+                self.follow_up(channel, self.post_async(channel, blocks, priority, fp, incident), later, fp)
+            except Exception as e:
+                self.dedup.release(channel, fp)
+                if len(texts) == 1:
+                    raise
+                print("⚠️ Bulk event triage failed:", repr(e))
+
+_pipeline: TriagePipeline | None = None
+_pipeline_lock = threading.Lock()
+
+def get_pipeline() -> TriagePipeline:
+    """The process-wide pipeline (created on first use from SLACK_BOT_TOKEN / SLACK_CHANNEL_ID)."""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = p = TriagePipeline(token=os.getenv("SLACK_BOT_TOKEN"), channel=os.getenv("SLACK_CHANNEL_ID") or None)
+                Gauge("triageo_triage_queue_depth", "Triage jobs waiting for a worker.", lambda: p.jobs.depth)
+                Gauge("triageo_slack_queue_depth", "Slack calls waiting in the delivery queue.", lambda: p.delivery.stats()["queued"])
+                Gauge("triageo_cohere_circuit_open", "1 while Cohere calls are being skipped.", lambda: p.breaker.state == "open")
+    return _pipeline
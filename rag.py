@@ -1,61 +1,367 @@
-import json, os
+import hashlib, json, math, os, re, tempfile, threading
+from pathlib import Path
 from typing import List, Dict, Tuple
 import numpy as np
-
-try:
-    import cohere
-except Exception:
-    cohere = None
+from metrics import FALLBACKS, stage, timed
+from resilience import COHERE_BREAKER, COHERE_EMBED_TIMEOUT_S, cohere, cohere_client, request_options
 
 INDEX_PATH = os.getenv("INDEX_PATH", ".kb_index.json")
+VECTORS_PATH = os.getenv("VECTORS_PATH", os.path.splitext(INDEX_PATH)[0] + ".npy")
 EMBED_PROVIDER = os.getenv("EMBED_PROVIDER", "cohere")
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")
+EMBED_MODEL = os.getenv("EMBED_MODEL", "embed-english-v3.0")
+EMBED_BATCH = int(os.getenv("EMBED_BATCH", "96"))
+LOCAL_EMBED_DIM = int(os.getenv("LOCAL_EMBED_DIM", "1024"))
+LOCAL_NGRAMS = (3, 4, 5)
+
+_FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+_FNV_PRIME = np.uint64(0x100000001b3)
 
-def _embed_texts(texts: List[str]) -> np.ndarray:
+def _provider() -> str:
+    """"cohere" when selected and configured; otherwise the offline "local" embedder."""
     if EMBED_PROVIDER == "cohere" and cohere and COHERE_API_KEY:
-        co = cohere.Client(COHERE_API_KEY)
-        resp = co.embed(texts=texts, model="embed-english-v3.0")
-        return np.array(resp.embeddings, dtype="float32")
-    rng = np.random.default_rng(0)
-    return rng.normal(size=(len(texts), 384)).astype("float32")
+        return "cohere"
+    return "local"
+
+def _local_embed(texts: List[str], dim: int = LOCAL_EMBED_DIM) -> np.ndarray:
+    """Hashed character n-gram embedding (feature hashing with signed buckets, sublinear tf).
+
+    Deterministic, needs no model or network, and is vectorized over the whole
+    batch: every n-gram of every text is hashed with FNV-1a in one NumPy pass.
+    """
+    n = len(texts)
+    out = np.zeros(n * dim, dtype="float64")
+    encoded = [f" {t.lower()} ".encode("utf-8") for t in texts]
+    lens = np.fromiter(map(len, encoded), dtype=np.int64, count=n)
+    buf = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+    row_of = np.repeat(np.arange(n, dtype=np.int64), lens)
+    for g in LOCAL_NGRAMS:
+        m = len(buf) - g + 1
+        if m <= 0:
+            continue
+        h = np.full(m, _FNV_OFFSET, dtype=np.uint64)
+        for j in range(g):
+            h = (h ^ buf[j:j + m]) * _FNV_PRIME
+        rows = row_of[:m]
+        keep = rows == row_of[g - 1:]  # drop n-grams spanning two texts
+        h, rows = h[keep], rows[keep]
+        buckets = ((h >> np.uint64(32)) % np.uint64(dim)).astype(np.int64)
+        signs = np.where((h >> np.uint64(31)) & np.uint64(1), 1.0, -1.0)
+        out += np.bincount(rows * dim + buckets, weights=signs, minlength=n * dim)
+    out = out.reshape(n, dim)
+    out = np.sign(out) * np.log1p(np.abs(out))
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (out / norms).astype("float32")
+
+def _embed_texts(texts: List[str], input_type: str = "search_document") -> np.ndarray:
+    with stage("embed"):
+        if _provider() == "cohere":
+            resp = COHERE_BREAKER.call(cohere_client().embed, texts=texts, model=EMBED_MODEL, input_type=input_type,
+                                       request_options=request_options(COHERE_EMBED_TIMEOUT_S))
+            return np.array(resp.embeddings, dtype="float32")
+        return _local_embed(texts)
 
 def _cosine(a: np.ndarray, b: np.ndarray) -> float:
     denom = (np.linalg.norm(a) * np.linalg.norm(b)) or 1.0
     return float(np.dot(a, b) / denom)
 
-def build_index() -> None:
-    docs = []
-    kb_files = ["kb/owasp_llm_top10.md", "kb/runbooks.md"]
-    for fp in kb_files:
-        if not os.path.exists(fp):
+KB_DIR = os.getenv("KB_DIR", "kb")
+KB_EXTENSIONS = (".md", ".markdown", ".txt")
+KB_CHUNK_CHARS = int(os.getenv("KB_CHUNK_CHARS", "500"))
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid")  # hybrid | dense | bm25
+RRF_K = 60
+FALLBACK_DOC = "OWASP LLM Top10: Prompt Injection, Data Exfiltration, Insecure Output Handling, Over-permissioned Tools, Data Poisoning, SSRF via tools, etc."
+_kb_signature = None
+
+def _embedder_id() -> str:
+    if _provider() == "cohere":
+        return f"cohere:{EMBED_MODEL}"
+    return f"local:ngram{LOCAL_NGRAMS[0]}-{LOCAL_NGRAMS[-1]}:{LOCAL_EMBED_DIM}"
+
+def _chunk_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def _kb_files() -> List[str]:
+    root = Path(KB_DIR)
+    if not root.is_dir():
+        return []
+    return sorted(str(p) for p in root.rglob("*") if p.is_file() and p.suffix.lower() in KB_EXTENSIONS)
+
+def _chunk(text: str, limit: int = KB_CHUNK_CHARS) -> List[str]:
+    """Blank-line paragraphs; paragraphs over ``limit`` chars are split on line boundaries."""
+    chunks = []
+    for para in (t.strip() for t in text.split("\n\n")):
+        if len(para) <= limit:
+            if para:
+                chunks.append(para)
             continue
+        cur = ""
+        for line in para.splitlines():
+            while len(line) > limit:
+                if cur:
+                    chunks.append(cur)
+                    cur = ""
+                chunks.append(line[:limit])
+                line = line[limit:]
+            if cur and len(cur) + 1 + len(line) > limit:
+                chunks.append(cur)
+                cur = ""
+            cur = f"{cur}\n{line}" if cur else line
+        if cur.strip():
+            chunks.append(cur.strip())
+    return chunks
+
+def _load_store() -> Tuple[Dict, np.ndarray | None]:
+    try:
+        with open(INDEX_PATH, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        vecs = np.load(VECTORS_PATH, mmap_mode="r")
+    except (OSError, ValueError):
+        return {}, None
+    if len(meta.get("docs", [])) != len(vecs):
+        return {}, None
+    return meta, vecs
+
+def _atomic_write(path: str, write) -> None:
+    # A unique temp file per writer, so concurrent builds (other processes included) never share one.
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".",
+                                     suffix=".tmp", delete=False) as f:
+        try:
+            write(f)
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+
+_build_lock = threading.Lock()  # one rebuild at a time; callers behind it see the finished store
+
+@timed("index_build")
+def build_index(force: bool = False) -> None:
+    """Bring the on-disk index in line with the KB, embedding only new or changed chunks.
+
+    The store is two files: INDEX_PATH (JSON metadata, one entry per row) and
+    VECTORS_PATH (a float32 .npy of unit vectors that loads memory-mapped).
+    Nothing is embedded or rewritten when the KB is unchanged, unless ``force``
+    (used when the store on disk turned out to be unreadable).
+    """
+    with _build_lock:
+        _build_index(force)
+
+def _build_index(force: bool) -> None:
+    global _kb_signature
+    sig = []
+    for fp in _kb_files():
+        try:
+            st = os.stat(fp)
+            sig.append((fp, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            continue
+    if not force and sig == _kb_signature and os.path.exists(INDEX_PATH) and os.path.exists(VECTORS_PATH):
+        return
+
+    docs = []
+    for fp, _, _ in sig:
         with open(fp, "r", encoding="utf-8") as f:
             text = f.read()
-        chunks = [t.strip() for t in text.split("\n\n") if t.strip()]
-        for ch in chunks:
-            docs.append({"text": ch})
+        for ch in _chunk(text):
+            docs.append({"text": ch, "source": fp})
     if not docs:
-        docs = [{"text": "OWASP LLM Top10: Prompt Injection, Data Exfiltration, Insecure Output Handling, Over-permissioned Tools, Data Poisoning, SSRF via tools, etc."}]
-
-    embs = _embed_texts([d["text"] for d in docs])
-    for d, e in zip(docs, embs):
-        d["vec"] = e.tolist()
-    with open(INDEX_PATH, "w", encoding="utf-8") as f:
-        json.dump({"docs": docs}, f)
-
-def search(query: str, k: int = 3) -> List[Dict]:
-    if not os.path.exists(INDEX_PATH):
-        build_index()
-    with open(INDEX_PATH, "r", encoding="utf-8") as f:
-        idx = json.load(f)
-    docs = idx.get("docs", [])
-    qv = _embed_texts([query])[0]
-    scored: List[Tuple[float, Dict]] = []
+        docs = [{"text": FALLBACK_DOC, "source": None}]
     for d in docs:
-        import numpy as np
-        v = np.array(d["vec"], dtype="float32")
-        denom = (np.linalg.norm(qv) * np.linalg.norm(v)) or 1.0
-        score = float(np.dot(qv, v) / denom)
-        scored.append((score, d))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [d for _, d in scored[:k]]
+        d["hash"] = _chunk_hash(d["text"])
+
+    embedder = _embedder_id()
+    meta, old_vecs = _load_store()
+    old_rows: Dict[str, int] = {}
+    if old_vecs is not None and meta.get("embedder") == embedder:
+        old_rows = {d["hash"]: i for i, d in enumerate(meta["docs"])}
+        if not force and [d["hash"] for d in docs] == [d["hash"] for d in meta["docs"]]:
+            _kb_signature = sig
+            return
+
+    missing = list(dict.fromkeys(d["hash"] for d in docs if d["hash"] not in old_rows))
+    texts = {d["hash"]: d["text"] for d in docs}
+    fresh: Dict[str, np.ndarray] = {}
+    for i in range(0, len(missing), EMBED_BATCH):
+        batch = missing[i:i + EMBED_BATCH]
+        embs = _embed_texts([texts[h] for h in batch])
+        norms = np.linalg.norm(embs, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        for h, e in zip(batch, embs / norms):
+            fresh[h] = e
+
+    dim = len(next(iter(fresh.values()))) if fresh else old_vecs.shape[1]
+    mat = np.empty((len(docs), dim), dtype="float32")
+    for i, d in enumerate(docs):
+        h = d["hash"]
+        mat[i] = fresh[h] if h in fresh else old_vecs[old_rows[h]]
+
+    digest = _chunk_hash(embedder + "".join(d["hash"] for d in docs))
+    _atomic_write(VECTORS_PATH, lambda f: np.save(f, mat))
+    _atomic_write(INDEX_PATH, lambda f: f.write(json.dumps(
+        {"embedder": embedder, "dim": dim, "digest": digest, "docs": docs}).encode("utf-8")))
+    _kb_signature = sig
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+class BM25Index:
+    """Okapi BM25 over the KB chunks as an inverted index of precomputed per-posting weights.
+
+    Each posting already carries idf * saturated tf, so a query is a handful of
+    scatter-adds into a score vector.
+    """
+
+    def __init__(self, texts: List[str], k1: float = 1.2, b: float = 0.75):
+        self.n = len(texts)
+        postings: Dict[str, Dict[int, int]] = {}
+        lengths = np.zeros(self.n, dtype="float32")
+        for i, text in enumerate(texts):
+            toks = _tokens(text)
+            lengths[i] = len(toks)
+            for t in toks:
+                row = postings.setdefault(t, {})
+                row[i] = row.get(i, 0) + 1
+        avgdl = float(lengths.mean()) if self.n and lengths.sum() else 1.0
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, row in postings.items():
+            ids = np.fromiter(row.keys(), dtype=np.int64, count=len(row))
+            tf = np.fromiter(row.values(), dtype="float32", count=len(row))
+            idf = math.log(1 + (self.n - len(row) + 0.5) / (len(row) + 0.5))
+            norm = k1 * (1 - b + b * lengths[ids] / avgdl)
+            self.postings[term] = (ids, (idf * tf * (k1 + 1) / (tf + norm)).astype("float32"))
+
+    def scores(self, query: str) -> np.ndarray:
+        out = np.zeros(self.n, dtype="float32")
+        for t in set(_tokens(query)):
+            hit = self.postings.get(t)
+            if hit is not None:
+                out[hit[0]] += hit[1]
+        return out
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+def _rrf(rankings: List[np.ndarray], k: int) -> List[int]:
+    """Reciprocal rank fusion of several best-first id rankings."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, i in enumerate(ranking.tolist()):
+            fused[i] = fused.get(i, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)[:k]
+
+class VectorIndex:
+    """Resident view of the index store: pre-normalized float32 rows, memory-mapped.
+
+    Loaded once and reloaded only when the metadata file's mtime or content
+    hash changes, so a query costs one matrix-vector product plus an argpartition.
+    """
+
+    def __init__(self, path: str = INDEX_PATH, vectors_path: str = VECTORS_PATH):
+        self.path = path
+        self.vectors_path = vectors_path
+        self.docs: List[Dict] = []
+        self.matrix = np.zeros((0, 0), dtype="float32")
+        self.bm25 = BM25Index([])
+        self._stat: Tuple[int, int] | None = None
+        self._digest: str | None = None
+        self._lock = threading.RLock()
+
+    def refresh(self) -> None:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            build_index()
+            st = os.stat(self.path)
+        if (st.st_mtime_ns, st.st_size) == self._stat:
+            return
+        with self._lock:
+            for attempt in range(2):
+                st = os.stat(self.path)
+                stat = (st.st_mtime_ns, st.st_size)
+                if stat == self._stat:
+                    return
+                with open(self.path, "rb") as f:
+                    raw = f.read()
+                digest = hashlib.sha1(raw).hexdigest()
+                if digest == self._digest or self._load(raw):
+                    self._digest, self._stat = digest, stat
+                    return
+                if attempt:
+                    raise RuntimeError(f"KB index {self.path} is unreadable even after a rebuild")
+                # Legacy, corrupt or half-written store: rebuild it once, then load the result.
+                build_index(force=True)
+
+    def _load(self, raw: bytes) -> bool:
+        try:
+            meta = json.loads(raw)
+            mat = np.load(self.vectors_path, mmap_mode="r")
+        except (OSError, ValueError, EOFError):
+            return False
+        docs = meta.get("docs", []) if isinstance(meta, dict) else []
+        if "embedder" not in meta or len(mat) != len(docs):
+            return False
+        self.docs, self.matrix, self.bm25 = docs, mat, BM25Index([d["text"] for d in docs])
+        return True
+
+    def search(self, query: str, k: int = 3, mode: str | None = None) -> List[Dict]:
+        return self.search_many([query], k, mode)[0]
+
+    @timed("search")
+    def search_many(self, queries: List[str], k: int = 3, mode: str | None = None) -> List[List[Dict]]:
+        """Top-k for every query.
+
+        Dense scores come from one batched embedding pass and one matrix-matrix
+        product; in hybrid mode they are fused with BM25 by reciprocal rank.
+        """
+        self.refresh()
+        mode = mode or SEARCH_MODE
+        docs, mat, bm25 = self.docs, self.matrix, self.bm25
+        if not docs or k <= 0 or not queries:
+            return [[] for _ in queries]
+        uniq = list(dict.fromkeys(queries))  # bursts repeat the same summary
+        depth = max(k * 5, 50)  # candidates per ranker before fusion
+        dense = None
+        if mode != "bm25":
+            try:
+                qv = np.concatenate([_embed_texts(uniq[i:i + EMBED_BATCH], input_type="search_query")
+                                     for i in range(0, len(uniq), EMBED_BATCH)])
+            except Exception as e:
+                if mode == "dense":
+                    raise
+                print("⚠️ Query embedding failed, using BM25 only:", repr(e))
+                FALLBACKS.inc(kind="bm25_only")
+                mode = "bm25"
+            else:
+                norms = np.linalg.norm(qv, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                dense = (qv / norms) @ mat.T
+        hits = {}
+        for qi, q in enumerate(uniq):
+            if mode == "dense":
+                ids = _top(dense[qi], k).tolist()
+            elif mode == "bm25":
+                lexical = bm25.scores(q)
+                ids = _top(lexical, min(k, int(np.count_nonzero(lexical)))).tolist()
+            else:
+                lexical = bm25.scores(q)
+                rankings = [_top(dense[qi], depth), _top(lexical, min(depth, int(np.count_nonzero(lexical))))]
+                ids = _rrf(rankings, k)
+            hits[q] = [docs[i] for i in ids]
+        return [hits[q] for q in queries]
+
+INDEX = VectorIndex()
+
+def search(query: str, k: int = 3, mode: str | None = None) -> List[Dict]:
+    return INDEX.search_many([query], k, mode)[0]
+
+def search_many(queries: List[str], k: int = 3, mode: str | None = None) -> List[List[Dict]]:
+    return INDEX.search_many(queries, k, mode)
@@ -0,0 +1,131 @@
+# resilience.py — provider timeouts, a circuit breaker, and per-stage time budgets
+import os, threading, time
+from concurrent.futures import Executor, TimeoutError as FutureTimeout
+
+try:
+    import cohere
+except Exception:
+    cohere = None
+
+COHERE_API_KEY = os.getenv("COHERE_API_KEY")
+COHERE_BASE_URL = os.getenv("COHERE_BASE_URL")  # e.g. a local stand-in for load tests
+COHERE_EMBED_TIMEOUT_S = float(os.getenv("COHERE_EMBED_TIMEOUT_S", "3"))
+COHERE_CHAT_TIMEOUT_S = float(os.getenv("COHERE_CHAT_TIMEOUT_S", "20"))
+COHERE_BREAKER_FAILURES = int(os.getenv("COHERE_BREAKER_FAILURES", "5"))   # consecutive failures that open it
+COHERE_BREAKER_RESET_S = float(os.getenv("COHERE_BREAKER_RESET_S", "30"))  # how long to skip Cohere once open
+
+class CircuitOpen(RuntimeError):
+    """The provider is being skipped after repeated failures."""
+
+class StageTimeout(TimeoutError):
+    """A pipeline stage ran past its time budget."""
+
+class CircuitBreaker:
+    """Closed → open after ``failures`` consecutive errors → half-open after ``reset_s``.
+
+    While open, ``call()`` raises CircuitOpen without touching the provider.
+    Half-open lets a single probe through; its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failures: int = COHERE_BREAKER_FAILURES, reset_s: float = COHERE_BREAKER_RESET_S,
+                 clock=time.monotonic):
+        self.name = name
+        self.failures = failures
+        self.reset_s = reset_s
+        self.clock = clock
+        self._errors = 0
+        self._opened_at: float | None = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.trips = self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if self.clock() - self._opened_at >= self.reset_s else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self.clock() - self._opened_at >= self.reset_s and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self._errors = 0
+            self._opened_at = None
+            self._probing = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self._errors += 1
+            if self._probing or (self._opened_at is None and self._errors >= self.failures):
+                if self._opened_at is None:
+                    print(f"⛔ {self.name} circuit opened after {self._errors} failures; skipping for {self.reset_s:.0f}s")
+                self.trips += 1
+                self._opened_at = self.clock()
+            self._probing = False
+
+    def call(self, fn, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpen(f"{self.name} circuit open")
+        try:
+            out = fn(*args, **kwargs)
+        except Exception:
+            self.failure()
+            raise
+        self.success()
+        return out
+
+    def stats(self) -> dict:
+        return {"state": self.state, "trips": self.trips, "rejected": self.rejected}
+
+COHERE_BREAKER = CircuitBreaker("cohere")
+_client = None
+_client_lock = threading.Lock()
+
+def cohere_client():
+    """One long-lived Cohere client per process (keeps its HTTP connection pool warm)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = cohere.Client(COHERE_API_KEY, base_url=COHERE_BASE_URL,
+                                        timeout=max(COHERE_EMBED_TIMEOUT_S, COHERE_CHAT_TIMEOUT_S))
+    return _client
+
+def request_options(timeout: float) -> dict:
+    """Per-call Cohere options: a hard HTTP timeout and no SDK retries (the breaker decides)."""
+    return {"timeout_in_seconds": max(1, round(timeout)), "max_retries": 0}
+
+class Deadline:
+    """An absolute end time that stage budgets are clipped to."""
+
+    def __init__(self, budget: float, clock=time.monotonic):
+        self.clock = clock
+        self.end = clock() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.end - self.clock())
+
+    def cap(self, budget: float) -> float:
+        return min(budget, self.remaining())
+
+def run_bounded(executor: Executor, budget: float, fn, *args, **kwargs):
+    """Run ``fn`` on ``executor`` and wait at most ``budget`` seconds for it.
+
+    On timeout the caller moves on with StageTimeout; the worker thread itself
+    is only freed once the provider's own HTTP timeout fires.
+    """
+    future = executor.submit(fn, *args, **kwargs)
+    try:
+        return future.result(timeout=budget)
+    except FutureTimeout:
+        future.cancel()
+        raise StageTimeout(f"{getattr(fn, '__name__', 'stage')} exceeded {budget:.1f}s") from None
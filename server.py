@@ -1,18 +1,17 @@
-import os
+import json, os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Response
-from pydantic import BaseModel
-from triage import parse_log, baseline_severity, summarize
-from rag import search, build_index
-from llm import triage_with_llm
-from blockkit import triage_blocks
-from slack_sdk.web import WebClient
-
-SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
-SLACK_CHANNEL_ID = os.getenv("SLACK_CHANNEL_ID", "")
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, ValidationError
+import metrics
+from pipeline import get_pipeline
+
 INGEST_SECRET = os.getenv("INGEST_SECRET")
+INGEST_RETRY_AFTER = os.getenv("INGEST_RETRY_AFTER", "5")  # seconds, sent with 429
+INGEST_BULK_MAX = int(os.getenv("INGEST_BULK_MAX", "1000"))  # events per bulk request
 
-client = WebClient(token=SLACK_BOT_TOKEN)
-api = FastAPI(title="Triageo Ingest")
+pipeline = get_pipeline()
+jobs = pipeline.jobs
 
 class SiemEvent(BaseModel):
     source: str | None = None
@@ -22,17 +21,28 @@ class SiemEvent(BaseModel):
     raw: dict | None = None
     lines: list[str] | None = None
 
-def triage_text_to_slack(text: str, channel: str | None = None):
-    build_index()
-    parsed = parse_log(text)
-    base = baseline_severity(parsed)
-    summary = summarize(parsed)
-    ev = [d["text"] for d in search(summary, k=3)]
-    result = triage_with_llm(summary=summary, baseline=base, evidence_snippets=ev)
-    blocks = triage_blocks(result)
-    client.chat_postMessage(channel=channel or SLACK_CHANNEL_ID, blocks=blocks)
-
-@api.post("/ingest/siem")
+def triage_text_to_slack(text: str, channel: str | None = None, rule: str | None = None):
+    pipeline.triage_batch_to_slack([text], channel, [rule])
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    pipeline.start()
+    yield
+    pipeline.stop()
+
+api = FastAPI(title="Triageo Ingest", lifespan=lifespan)
+
+def _event_text(evt: SiemEvent, body: dict) -> str:
+    if evt.lines:
+        return "\n".join(evt.lines)
+    if evt.message:
+        return evt.message
+    if evt.raw:
+        # Keep structured events as JSON so the format parsers (CloudTrail, JSON lines) see their fields.
+        return json.dumps(evt.raw, separators=(",", ":"), default=str)
+    return str(body)
+
+@api.post("/ingest/siem", status_code=202)
 async def ingest(req: Request):
     # Optional shared-secret check
     if INGEST_SECRET and req.headers.get("X-Triageo-Secret") != INGEST_SECRET:
@@ -40,18 +50,88 @@ async def ingest(req: Request):
 
     try:
         body = await req.json()
-    except Exception:
-        body = {}
-    evt = SiemEvent(**body)
+    except ValueError as e:  # includes json.JSONDecodeError and bad UTF-8
+        return JSONResponse({"ok": False, "error": f"invalid JSON body: {e}"}, status_code=400)
+    if not isinstance(body, dict):
+        return JSONResponse({"ok": False, "error": "expected a JSON object"}, status_code=400)
+    try:
+        evt = SiemEvent(**body)
+    except ValidationError as e:
+        return JSONResponse({"ok": False, "error": e.errors(include_url=False, include_context=False)}, status_code=422)
 
-    if evt.lines:
-        text = "\n".join(evt.lines)
-    elif evt.message:
-        text = evt.message
-    elif evt.raw:
-        text = str(evt.raw.get("message") or evt.raw.get("log") or evt.raw)
-    else:
-        text = str(body)
-
-    triage_text_to_slack(text=text, channel=os.getenv("SLACK_CHANNEL_ID"))
-    return {"ok": True}
+    # Triage runs on the worker pool; the event loop only validates and enqueues.
+    if not jobs.submit({"text": _event_text(evt, body), "rule": evt.rule}):
+        return JSONResponse({"ok": False, "error": "ingest queue full"}, status_code=429,
+                            headers={"Retry-After": INGEST_RETRY_AFTER})
+    return {"ok": True, "queued": jobs.depth}
+
+def _parse_ndjson_line(line: str):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return e
+
+def _parse_bulk(raw: bytes, content_type: str) -> list:
+    """A JSON array of events, or NDJSON (one event per line).
+
+    An NDJSON line that isn't valid JSON becomes its ValueError, so the other lines still go through.
+    """
+    text = raw.decode("utf-8", errors="replace").strip()
+    if "ndjson" not in content_type and text.startswith("["):
+        items = json.loads(text)
+        if not isinstance(items, list):
+            raise ValueError("expected a JSON array")
+        return items
+    return [_parse_ndjson_line(ln) for ln in text.splitlines() if ln.strip()]
+
+@api.post("/ingest/siem/bulk", status_code=202)
+async def ingest_bulk(req: Request):
+    if INGEST_SECRET and req.headers.get("X-Triageo-Secret") != INGEST_SECRET:
+        return Response(status_code=401)
+
+    try:
+        items = _parse_bulk(await req.body(), req.headers.get("content-type", ""))
+    except ValueError as e:  # includes json.JSONDecodeError
+        return JSONResponse({"ok": False, "error": f"invalid bulk body: {e}"}, status_code=400)
+    if len(items) > INGEST_BULK_MAX:
+        return JSONResponse({"ok": False, "error": f"at most {INGEST_BULK_MAX} events per request"}, status_code=413)
+
+    texts, rules, rejected = [], [], []
+    for i, body in enumerate(items):
+        if isinstance(body, ValueError):
+            rejected.append({"index": i, "error": f"invalid JSON: {body}"})
+            continue
+        if not isinstance(body, dict):
+            rejected.append({"index": i, "error": "expected a JSON object"})
+            continue
+        try:
+            evt = SiemEvent(**body)
+            texts.append(_event_text(evt, body))
+            rules.append(evt.rule)
+        except ValidationError as e:
+            rejected.append({"index": i, "error": e.errors(include_url=False, include_context=False)})
+
+    if texts and not jobs.submit({"texts": texts, "rules": rules}):
+        return JSONResponse({"ok": False, "error": "ingest queue full"}, status_code=429,
+                            headers={"Retry-After": INGEST_RETRY_AFTER})
+    return {"ok": True, "accepted": len(texts), "rejected": rejected, "queued": jobs.depth}
+
+@api.get("/ingest/queue")
+def ingest_queue():
+    return {**jobs.stats(), "delivery": pipeline.delivery.stats()}
+
+@api.get("/metrics")
+def prometheus_metrics():
+    """Stage latency histograms, fallback/cache/Slack error counters and queue gauges for Prometheus."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@api.get("/incidents")
+def list_incidents(req: Request, ip: str | None = None, status: str = "open", limit: int = 100):
+    """Open incidents for ``ip`` in the lookback window, or the latest incidents with ``status``."""
+    if INGEST_SECRET and req.headers.get("X-Triageo-Secret") != INGEST_SECRET:
+        return Response(status_code=401)
+    store = pipeline.incidents
+    if store is None:
+        return JSONResponse({"ok": False, "error": "incident store disabled"}, status_code=404)
+    rows = store.open_for_ip(ip)[:limit] if ip else store.by_status(status, limit)
+    return {"ok": True, "incidents": rows}
@@ -0,0 +1,106 @@
+# sketches.py — fixed-size streaming summaries for high-cardinality log fields
+import hashlib, math
+from typing import Dict, List, Tuple
+
+def _hash64(item: str) -> int:
+    # Stable across processes (unlike hash()), so sketches from parse_file workers merge.
+    return int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big")
+
+class SpaceSaving:
+    """Top-k heavy hitters in ``capacity`` counters (Metwally et al.).
+
+    Counts are upper bounds, overestimating by at most ``errors[item]``; the
+    result is exact while no more than ``capacity`` distinct items have been seen.
+    ``top()`` reports the guaranteed (lower-bound) counts.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        # Eviction candidates: items that held the minimum count when last computed.
+        # Counts only grow, so stale entries are skipped and the list is rebuilt lazily.
+        self._low: List[str] = []
+        self._low_count = 0
+
+    def _victim(self) -> str:
+        counts = self.counts
+        while self._low:
+            item = self._low.pop()
+            if counts.get(item) == self._low_count:
+                return item
+        self._low_count = min(counts.values())
+        self._low = [k for k, v in counts.items() if v == self._low_count]
+        return self._low.pop()
+
+    def add(self, item: str, n: int = 1) -> None:
+        counts = self.counts
+        if item in counts:
+            counts[item] += n
+        elif len(counts) < self.capacity:
+            counts[item] = n
+            self.errors[item] = 0
+        else:
+            victim = self._victim()
+            floor = counts.pop(victim)
+            del self.errors[victim]
+            counts[item] = floor + n
+            self.errors[item] = floor
+
+    def _floor(self) -> int:
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """Fold ``other`` in; an item missing from a full summary is charged that summary's minimum."""
+        fa, fb = self._floor(), other._floor()
+        merged = {}
+        for item in self.counts.keys() | other.counts.keys():
+            c = self.counts.get(item, fa) + other.counts.get(item, fb)
+            e = self.errors.get(item, fa) + other.errors.get(item, fb)
+            merged[item] = (c, e)
+        keep = sorted(merged.items(), key=lambda kv: kv[1][0], reverse=True)[:self.capacity]
+        self.counts = {k: c for k, (c, _) in keep}
+        self.errors = {k: e for k, (_, e) in keep}
+        self._low = []
+        return self
+
+    def top(self, n: int = 5) -> List[Tuple[str, int]]:
+        """Up to ``n`` (item, guaranteed count) pairs, heaviest first.
+
+        Only items whose guaranteed count (count - error) beats the summary's
+        minimum are reported: any untracked item may have occurred that often,
+        so a weaker item cannot be told apart from the noise.
+        """
+        floor = self._floor() if any(self.errors.values()) else 0  # nothing evicted: untracked items never occurred
+        sure = ((k, c - self.errors[k]) for k, c in self.counts.items())
+        return sorted((kv for kv in sure if kv[1] > floor), key=lambda kv: (-kv[1], kv[0]))[:n]  # ties by name: stable across shards
+
+class HyperLogLog:
+    """Distinct-count estimate in 2**p one-byte registers (~1.04/sqrt(2**p) relative error)."""
+
+    def __init__(self, p: int = 12):
+        self.p = p
+        self.registers = bytearray(1 << p)
+
+    def add(self, item: str) -> None:
+        h = _hash64(item)
+        idx = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.p != self.p:
+            raise ValueError("cannot merge HyperLogLogs with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        est = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if est <= 2.5 * m and zeros:
+            est = m * math.log(m / zeros)  # linear counting for small cardinalities
+        return int(round(est))
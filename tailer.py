@@ -0,0 +1,241 @@
+# tailer.py — multi-file log tailer: inotify (polling fallback), rotation-aware, checkpointed
+import ctypes, ctypes.util, glob, json, os, select, sys, time
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+TAIL_PATHS = os.getenv("TAIL_PATHS", "samples/auth_burst.log")  # comma-separated files and globs
+TAIL_CHECKPOINT = os.getenv("TAIL_CHECKPOINT", ".tail_checkpoints.json")
+TAIL_POLL_S = float(os.getenv("TAIL_POLL_S", "1.0"))        # poll interval without inotify
+TAIL_RESCAN_S = float(os.getenv("TAIL_RESCAN_S", "30"))     # safety rescan interval with inotify
+TAIL_BATCH_LINES = int(os.getenv("TAIL_BATCH_LINES", "1000"))
+READ_CHUNK = 1 << 20
+
+# inotify(7) event masks
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE = 0x2, 0x4, 0x8
+IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x40, 0x80, 0x100, 0x200
+_WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+class _Inotify:
+    """Just enough of inotify via ctypes: watch directories, block until something changes."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add = libc.inotify_add_watch
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watched: set = set()
+
+    def watch(self, directory: str) -> None:
+        if directory in self.watched:
+            return
+        if self._add(self.fd, os.fsencode(directory), _WATCH_MASK) < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self.watched.add(directory)
+
+    def wait(self, timeout: float) -> bool:
+        """True if events arrived (they are drained; callers just re-check their files)."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+@dataclass
+class _File:
+    path: str
+    fh: object
+    dev: int
+    ino: int
+    offset: int          # byte offset just past the last delivered line
+    pending: bytes = b"" # trailing partial line, not yet delivered
+
+class LogTailer:
+    """Follow a set of files and globs, handing complete new lines downstream in batches.
+
+    Files are followed by inode: after a rename-style rotation the old file is
+    drained before switching to the new one, and a file that shrinks is
+    treated as truncated and re-read from the start. Offsets are checkpointed
+    after each batch the handler accepts, so a restart resumes where it left
+    off (including a file rotated away while we were down). Files seen for
+    the first time start at EOF, or at 0 if they appeared after startup.
+    """
+
+    def __init__(self, patterns: List[str] | str = TAIL_PATHS, checkpoint_path: str | None = TAIL_CHECKPOINT,
+                 batch_lines: int = TAIL_BATCH_LINES, use_inotify: bool = True):
+        if isinstance(patterns, str):
+            patterns = [p.strip() for p in patterns.split(",") if p.strip()]
+        self.patterns = patterns
+        self.checkpoint_path = checkpoint_path
+        self.batch_lines = batch_lines
+        self._files: Dict[str, _File] = {}
+        self._started = False
+        self._stopped = False
+        self._checkpoints = self._load_checkpoints()
+        self._inotify = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+            except OSError as e:
+                print("inotify unavailable, polling instead:", repr(e))
+
+    # ---- checkpoints ----
+    def _load_checkpoints(self) -> Dict[str, dict]:
+        if not self.checkpoint_path:
+            return {}
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_checkpoints(self) -> None:
+        if not self.checkpoint_path:
+            return
+        for tf in self._files.values():
+            self._checkpoints[tf.path] = {"dev": tf.dev, "ino": tf.ino, "offset": tf.offset}
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._checkpoints, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    # ---- file tracking ----
+    def _expand(self) -> List[str]:
+        paths = []
+        for pat in self.patterns:
+            paths.extend(glob.glob(pat) if glob.has_magic(pat) else [pat])
+        return sorted({p for p in paths if os.path.isfile(p)})
+
+    def _open(self, path: str, at_end: bool) -> _File | None:
+        try:
+            fh = open(path, "rb")
+        except OSError:
+            return None
+        st = os.fstat(fh.fileno())
+        ck = self._checkpoints.get(path)
+        if ck and (ck["dev"], ck["ino"]) == (st.st_dev, st.st_ino) and ck["offset"] <= st.st_size:
+            offset = ck["offset"]
+        else:
+            offset = st.st_size if at_end and not ck else 0
+        fh.seek(offset)
+        return _File(path, fh, st.st_dev, st.st_ino, offset)
+
+    def _rotated_remainder(self, path: str) -> _File | None:
+        """The file we were reading before a restart, if it was rotated to a sibling name meanwhile."""
+        ck = self._checkpoints.get(path)
+        if not ck:
+            return None
+        for cand in glob.glob(glob.escape(path) + "?*"):
+            try:
+                st = os.stat(cand)
+            except OSError:
+                continue
+            if (st.st_dev, st.st_ino) == (ck["dev"], ck["ino"]) and ck["offset"] < st.st_size:
+                fh = open(cand, "rb")
+                fh.seek(ck["offset"])
+                return _File(path, fh, st.st_dev, st.st_ino, ck["offset"])
+        return None
+
+    def _discover(self, handler) -> None:
+        for path in self._expand():
+            if path in self._files:
+                continue
+            old = self._rotated_remainder(path) if not self._started else None
+            if old is not None:
+                self._files[path] = old
+                self._pump(old, handler, final=True)
+            tf = self._open(path, at_end=not self._started)
+            if tf is not None:
+                self._files[path] = tf
+            if self._inotify is not None:
+                self._inotify.watch(os.path.dirname(os.path.abspath(path)))
+        if self._inotify is not None:
+            for pat in self.patterns:  # catch files that appear later
+                d = os.path.dirname(os.path.abspath(pat))
+                if os.path.isdir(d) and not glob.has_magic(d):
+                    self._inotify.watch(d)
+        self._started = True
+
+    def _check(self, tf: _File, handler) -> None:
+        try:
+            st = os.stat(tf.path)
+        except FileNotFoundError:
+            st = None
+        if st is None or (st.st_dev, st.st_ino) != (tf.dev, tf.ino):
+            # Rotated (renamed or deleted): finish the old inode, then follow the new file from 0.
+            self._pump(tf, handler, final=True)
+            tf.fh.close()
+            del self._files[tf.path]
+            if st is not None:
+                new = self._open(tf.path, at_end=False)
+                if new is not None:
+                    self._files[tf.path] = new
+                    self._pump(new, handler)
+            return
+        if st.st_size < tf.offset + len(tf.pending):
+            print(f"✂️ {tf.path} truncated; reading from the start")
+            tf.fh.seek(0)
+            tf.offset, tf.pending = 0, b""
+        self._pump(tf, handler)
+
+    def _pump(self, tf: _File, handler, final: bool = False) -> None:
+        while True:
+            data = tf.fh.read(READ_CHUNK)
+            if not data:
+                break
+            buf = tf.pending + data
+            cut = buf.rfind(b"\n") + 1
+            tf.pending = buf[cut:]
+            if not cut:
+                continue
+            raw = buf[:cut].split(b"\n")[:-1]
+            for i in range(0, len(raw), self.batch_lines):
+                batch = raw[i:i + self.batch_lines]
+                handler(tf.path, [ln.decode("utf-8", errors="replace").rstrip("\r") for ln in batch])
+                tf.offset += sum(map(len, batch)) + len(batch)
+                self._save_checkpoints()
+        if final and tf.pending:
+            handler(tf.path, [tf.pending.decode("utf-8", errors="replace")])
+            tf.offset += len(tf.pending)
+            tf.pending = b""
+            self._save_checkpoints()
+
+    # ---- main loop ----
+    def poll_once(self, handler: Callable[[str, List[str]], None]) -> None:
+        self._discover(handler)
+        try:
+            for tf in list(self._files.values()):
+                self._check(tf, handler)
+        except Exception:
+            # Rewind to the last checkpointed line so the failed batch is delivered again.
+            for tf in self._files.values():
+                tf.fh.seek(tf.offset)
+                tf.pending = b""
+            raise
+
+    def run(self, handler: Callable[[str, List[str]], None]) -> None:
+        """Block, calling ``handler(path, lines)`` for each batch of new complete lines."""
+        while not self._stopped:
+            try:
+                self.poll_once(handler)
+            except Exception as e:
+                print("Tail handler failed, will retry:", repr(e))
+                time.sleep(TAIL_POLL_S)
+            if self._inotify is not None:
+                self._inotify.wait(TAIL_RESCAN_S)
+            else:
+                time.sleep(TAIL_POLL_S)
+
+    def stop(self) -> None:
+        self._stopped = True
+        for tf in self._files.values():
+            tf.fh.close()
+        if self._inotify is not None:
+            self._inotify.close()
@@ -0,0 +1,5 @@
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MOCK_MODE", "true")
+os.environ.setdefault("EMBED_PROVIDER", "local")
@@ -0,0 +1,69 @@
+from dedup import AlertAggregator, fingerprint
+
+class Clock:
+    def __init__(self, t=1000.0):
+        self.t = t
+    def __call__(self):
+        return self.t
+
+class FakeClient:
+    def __init__(self):
+        self.updates = []
+    def chat_update(self, **kw):
+        self.updates.append(kw)
+
+def _agg(**kw):
+    clock, client = Clock(), FakeClient()
+    return AlertAggregator(client, window=900, idle=120, update_interval=10, clock=clock, **kw), client, clock
+
+def _seen(update):
+    return update["blocks"][-1]["elements"][0]["text"]
+
+def test_fingerprint_is_stable_and_field_sensitive():
+    assert fingerprint("auth", "high", "1.2.3.4") == fingerprint("auth", "high", "1.2.3.4")
+    assert fingerprint("auth", "high", "1.2.3.4") != fingerprint("auth", "high", "1.2.3.5")
+    assert fingerprint("auth", "high", "1.2.3.4", "rule") != fingerprint("auth", "high", "1.2.3.4")
+
+def test_repeats_are_folded_and_updates_are_throttled():
+    agg, client, clock = _agg()
+    assert agg.claim("C", "fp")
+    agg.opened("C", "fp", "1.1", [{"type": "section"}])
+    clock.t += 1
+    assert not agg.claim("C", "fp")  # within update_interval: counted, no update yet
+    assert client.updates == [] and agg.suppressed == 1
+    clock.t += 10
+    assert not agg.claim("C", "fp")
+    assert len(client.updates) == 1 and client.updates[0]["ts"] == "1.1"
+    assert "Seen *3* times" in _seen(client.updates[0])
+
+def test_sweep_flushes_pending_count_and_closes_idle_window():
+    agg, client, clock = _agg()
+    agg.claim("C", "fp")
+    agg.opened("C", "fp", "1.1", [])
+    clock.t += 1
+    agg.claim("C", "fp")
+    clock.t += 121
+    agg.sweep()
+    assert len(client.updates) == 1 and "Seen *2* times" in _seen(client.updates[0])
+    assert agg.claim("C", "fp")  # window closed: the next alert posts a new card
+
+def test_release_and_failed_post_reopen_the_fingerprint():
+    agg, _, _ = _agg()
+    assert agg.claim("C", "fp")
+    agg.release("C", "fp")
+    assert agg.claim("C", "fp")
+    agg.opened("C", "fp", None, [])  # post failed
+    assert agg.claim("C", "fp")
+
+def test_revise_pushes_new_blocks_with_the_counter():
+    agg, client, clock = _agg()
+    agg.claim("C", "fp")
+    agg.opened("C", "fp", "1.1", [{"type": "header"}])
+    agg.claim("C", "fp")
+    assert agg.revise("C", "fp", "1.1", [{"type": "section"}])
+    assert client.updates[-1]["blocks"][0] == {"type": "section"} and "Seen *2* times" in _seen(client.updates[-1])
+    assert not agg.revise("C", "fp", "other-ts", [])
+
+def test_zero_window_disables_dedup():
+    agg = AlertAggregator(FakeClient(), window=0)
+    assert agg.claim("C", "fp") and agg.claim("C", "fp")
@@ -0,0 +1,95 @@
+import threading
+from concurrent.futures import wait
+
+import pytest
+from slack_sdk.errors import SlackApiError
+
+import delivery
+from delivery import DeliveryQueueFull, DeliveryStopped, SlackDelivery
+
+class _Resp(dict):
+    def __init__(self, status, error="boom", headers=None):
+        super().__init__(ok=False, error=error)
+        self.status_code = status
+        self.headers = headers or {}
+
+class FakeClient:
+    """Stands in for WebClient: each method pops the next scripted outcome (exception or response)."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __getattr__(self, method):
+        def call(**kwargs):
+            with self.lock:
+                self.calls.append((method, kwargs))
+                out = self.outcomes.pop(0) if self.outcomes else {"ok": True, "ts": str(len(self.calls))}
+            if isinstance(out, Exception):
+                raise out
+            return out
+        return call
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(delivery, "DELIVERY_BACKOFF_S", 0.001)
+
+def test_call_has_finite_default_timeout():
+    assert SlackDelivery.call.__defaults__[-1] == delivery.DELIVERY_CALL_TIMEOUT_S > 0
+
+def test_server_errors_are_retried_then_succeed():
+    client = FakeClient(SlackApiError("5xx", _Resp(503)), SlackApiError("5xx", _Resp(502)))
+    d = SlackDelivery(client, max_retries=3)
+    resp = d.call("chat_update", channel="C", ts="1", timeout=5)
+    assert resp["ok"] and len(client.calls) == 3 and d.retried == 2
+    d.stop()
+
+def test_rate_limit_honours_retry_after():
+    client = FakeClient(SlackApiError("429", _Resp(429, "ratelimited", {"Retry-After": "0"})))
+    d = SlackDelivery(client)
+    assert d.call("chat_update", channel="C", ts="1", timeout=5)["ok"]
+    assert d.rate_limited == 1 and d.retried == 1
+    d.stop()
+
+def test_client_errors_fail_fast():
+    client = FakeClient(SlackApiError("nope", _Resp(400, "channel_not_found")), ValueError("bad argument"))
+    d = SlackDelivery(client, max_retries=5)
+    with pytest.raises(SlackApiError):
+        d.call("chat_update", channel="C", ts="1", timeout=5)
+    with pytest.raises(ValueError):
+        d.call("chat_update", channel="C", ts="2", timeout=5)
+    assert len(client.calls) == 2 and d.retried == 0
+    d.stop()
+
+def test_stop_fails_queued_calls():
+    d = SlackDelivery(FakeClient(), clock=lambda: 0.0)  # frozen clock: tokens never refill
+    sent = [d.submit("chat_postMessage", channel="C", text=str(i)) for i in range(5)]
+    wait(sent[:3], timeout=5)  # the burst goes out
+    d.stop()
+    wait(sent, timeout=5)
+    assert all(f.done() for f in sent)
+    assert all(isinstance(f.exception(), DeliveryStopped) for f in sent[3:])
+    assert isinstance(d.submit("chat_update", channel="C").exception(timeout=1), DeliveryStopped)
+
+def test_executor_shutdown_does_not_strand_futures():
+    d = SlackDelivery(FakeClient())
+    d._pool.shutdown()  # what interpreter exit does to the pool
+    f = d.submit("chat_update", channel="C", ts="1")
+    assert isinstance(f.exception(timeout=5), DeliveryStopped)
+    later = d.submit("chat_update", channel="C", ts="2")
+    assert isinstance(later.exception(timeout=5), DeliveryStopped)
+
+def test_full_queue_sheds_lowest_priority():
+    d = SlackDelivery(FakeClient(), queue_max=2, clock=lambda: 0.0)
+    for _ in range(3):  # use up the burst
+        d.call("chat_postMessage", channel="C", timeout=5)
+    low1 = d.submit("chat_postMessage", "low", channel="C")
+    low2 = d.submit("chat_postMessage", "low", channel="C")
+    critical = d.submit("chat_postMessage", "critical", channel="C")
+    assert isinstance(low2.exception(timeout=1), DeliveryQueueFull)  # newest of the lowest priority
+    low3 = d.submit("chat_postMessage", "low", channel="C")
+    assert isinstance(low3.exception(timeout=1), DeliveryQueueFull)
+    assert not low1.done() and not critical.done()
+    assert d.stats()["shed"] == 2
+    d.stop()
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from formats import FORMATS, detect_format, split_document
+from triage import parse_log
+
+NGINX = '203.0.113.9 - alice [10/Oct/2025:13:55:36 +0000] "POST /login HTTP/1.1" 401 512 "-" "curl/8"'
+SYSLOG = "Oct 10 13:55:36 web1 sshd[42]: Failed password for invalid user root from 198.51.100.7 port 22 ssh2"
+CLOUDTRAIL = json.dumps({"eventSource": "signin.amazonaws.com", "eventName": "ConsoleLogin",
+                         "sourceIPAddress": "192.0.2.44", "userIdentity": {"arn": "arn:aws:iam::1:user/bob"},
+                         "responseElements": {"ConsoleLogin": "Failure"}})
+JSON = json.dumps({"client_ip": "192.0.2.10", "status": 500, "method": "GET", "path": "/api/orders"})
+
+@pytest.mark.parametrize("line,fmt", [(NGINX, "nginx"), (SYSLOG, "syslog"), (CLOUDTRAIL, "cloudtrail"),
+                                      (JSON, "json"), ("user bob failed login from 1.2.3.4", None)])
+def test_detect_format(line, fmt):
+    assert detect_format([line] * 5) == fmt
+
+def test_detect_format_needs_a_majority():
+    assert detect_format([NGINX, "free text", "more text"]) is None
+
+def test_fields_are_extracted():
+    rec = FORMATS["nginx"].parse(NGINX)
+    assert (rec.ip, rec.status, rec.method, rec.path, rec.user) == ("203.0.113.9", 401, "POST", "/login", "alice")
+    rec = FORMATS["cloudtrail"].parse(CLOUDTRAIL)
+    assert (rec.ip, rec.user, rec.outcome) == ("192.0.2.44", "bob", "failure")
+    rec = FORMATS["syslog"].parse(SYSLOG)
+    assert (rec.event, rec.user, rec.outcome) == ("sshd", "root", "failure")
+
+@pytest.mark.parametrize("fmt,line", [
+    ("cloudtrail", '["eventName", "eventSource"]'),
+    ("cloudtrail", '"eventName eventSource"'),
+    ("json", "[1, 2]"),
+    ("json", '"just a string"'),
+])
+def test_wrongly_typed_json_is_not_a_record(fmt, line):
+    assert FORMATS[fmt].parse(line) is None
+
+def test_wrongly_typed_fields_are_dropped():
+    rec = FORMATS["cloudtrail"].parse(json.dumps({"eventSource": "s", "eventName": "ConsoleLogin", "userIdentity": "bob",
+                                                  "sourceIPAddress": 12, "responseElements": {"ConsoleLogin": 1}}))
+    assert (rec.ip, rec.user, rec.outcome) == (None, None, None)
+    rec = FORMATS["json"].parse(json.dumps({"ip": [1, 2], "method": {"x": 1}, "user": 5}))
+    assert (rec.ip, rec.method, rec.user) == (None, None, None)
+
+def test_bad_records_do_not_abort_the_parse():
+    lines = [CLOUDTRAIL] * 5 + ['["eventName", "eventSource"]', json.dumps({"eventSource": "s", "eventName": "x",
+                                                                              "sourceIPAddress": [1]})]
+    parsed = parse_log("\n".join(lines))
+    assert parsed["format"] == "cloudtrail" and parsed["line_count"] == 7 and parsed["top_ip"] == "192.0.2.44"
+
+def test_split_document_unwraps_cloudtrail_records():
+    doc = json.dumps({"Records": [json.loads(CLOUDTRAIL), "not a record", json.loads(CLOUDTRAIL)]})
+    assert len(split_document(doc)) == 2
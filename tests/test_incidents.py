@@ -0,0 +1,63 @@
+import pytest
+
+import incidents
+from incidents import IncidentStore
+
+class Clock:
+    def __init__(self, t=1_000_000.0):
+        self.t = t
+    def __call__(self):
+        return self.t
+
+@pytest.fixture
+def store(tmp_path):
+    clock = Clock()
+    s = IncidentStore(str(tmp_path / "incidents.db"), idle_s=600, expire_every=3600, clock=clock)
+    s.start()
+    yield s, clock
+    s.stop()
+
+def test_opened_and_actions_are_persisted_with_history(store):
+    s, clock = store
+    s.opened("C1", "1.1", "fp1", ip="10.0.0.1", severity="high")
+    clock.t += 5
+    assert s.act("C1", "1.1", "lower", "U1") == "lowered"
+    assert s.flush(5)
+    row = s.get("C1", "1.1")
+    assert (row["status"], row["severity"]) == ("lowered", "medium")
+    assert [(e["action"], e["user"]) for e in s.history("C1", "1.1")] == [("open", None), ("lower", "U1")]
+    assert s.stats()["written"] == 4 and s.stats()["failed"] == 0
+
+def test_repeat_of_acknowledged_incident_is_suppressed(store):
+    s, _ = store
+    s.opened("C1", "1.1", "fp1", ip="10.0.0.1")
+    s.act("C1", "1.1", "ack")
+    s.flush(5)
+    verdict, incident, _ = s.verdict("fp1", "10.0.0.1")
+    assert verdict == "suppress" and incident["ts"] == "1.1"
+
+def test_escalation_counts_distinct_open_fingerprints(store, monkeypatch):
+    monkeypatch.setattr(incidents, "INCIDENT_ESCALATE_AFTER", 2)
+    s, _ = store
+    s.opened("C1", "1.1", "fp1", ip="10.0.0.1")
+    s.opened("C1", "1.2", "fp1", ip="10.0.0.1")  # same fingerprint twice is one incident
+    s.opened("C1", "1.3", "fp2", ip="10.0.0.1", status="escalated")  # escalations don't count as open
+    s.flush(5)
+    assert s.verdict("fp3", "10.0.0.1")[0] == "post"
+    s.opened("C1", "1.4", "fp4", ip="10.0.0.1")
+    s.flush(5)
+    verdict, incident, note = s.verdict("fp3", "10.0.0.1")
+    assert verdict == "escalate" and incident["ts"] == "1.4" and "2 open incidents" in note
+
+def test_idle_open_incidents_expire(store):
+    s, clock = store
+    s.opened("C1", "1.1", "fp1", ip="10.0.0.1")
+    clock.t += 300
+    s.opened("C1", "1.2", "fp2", ip="10.0.0.1")
+    clock.t += 400
+    s.expire()
+    s.flush(5)
+    assert s.get("C1", "1.1")["status"] == "expired"
+    assert s.get("C1", "1.2")["status"] == "open"
+    assert [e["action"] for e in s.history("C1", "1.1")] == ["open", "expired"]
+    assert [r["ts"] for r in s.open_for_ip("10.0.0.1")] == ["1.2"]
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+import rag
+
+@pytest.fixture
+def kb(tmp_path, monkeypatch):
+    (tmp_path / "kb").mkdir()
+    (tmp_path / "kb" / "runbook.md").write_text(
+        "Brute force: block the source IP and enforce MFA.\n\nSQL injection: review WAF logs and sanitize inputs.\n")
+    monkeypatch.setattr(rag, "KB_DIR", str(tmp_path / "kb"))
+    monkeypatch.setattr(rag, "INDEX_PATH", str(tmp_path / "index.json"))
+    monkeypatch.setattr(rag, "VECTORS_PATH", str(tmp_path / "index.npy"))
+    monkeypatch.setattr(rag, "_kb_signature", None)
+    rag.build_index()
+    return rag.VectorIndex(rag.INDEX_PATH, rag.VECTORS_PATH)
+
+def test_search_finds_matching_chunk(kb):
+    assert "MFA" in kb.search("brute force login", k=1)[0]["text"]
+
+@pytest.mark.parametrize("victim", ["VECTORS_PATH", "INDEX_PATH"])
+def test_corrupt_store_is_rebuilt_once(kb, victim):
+    with open(getattr(rag, victim), "wb") as f:
+        f.write(b"\x93NUMPY garbage")  # signature unchanged, so a plain build_index() would be a no-op
+    kb.refresh()
+    assert len(kb.docs) == 2 and kb.search("sql injection", k=1)[0]["text"].startswith("SQL")
+
+def test_unrepairable_store_raises_instead_of_recursing(kb, monkeypatch):
+    with open(rag.VECTORS_PATH, "wb") as f:
+        f.write(b"garbage")
+    monkeypatch.setattr(rag, "build_index", lambda force=False: None)
+    with pytest.raises(RuntimeError):
+        kb.refresh()
+
+def test_unchanged_kb_is_not_rewritten(kb):
+    before = os.stat(rag.VECTORS_PATH).st_mtime_ns
+    rag.build_index()
+    assert os.stat(rag.VECTORS_PATH).st_mtime_ns == before
+
+def test_concurrent_builds_publish_a_whole_store(kb, tmp_path):
+    import threading
+    (tmp_path / "kb" / "more.md").write_text("\n\n".join(f"Runbook {i}: rotate credential {i}." for i in range(200)))
+    threads = [threading.Thread(target=rag.build_index, kwargs={"force": True}) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    kb.refresh()
+    assert len(kb.docs) == 202
+    assert not [p for p in os.listdir(tmp_path) if p.endswith(".tmp")]
@@ -0,0 +1,36 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+@pytest.fixture
+def client(monkeypatch):
+    queued = []
+    monkeypatch.setattr(server, "INGEST_SECRET", None)
+    monkeypatch.setattr(server.jobs, "submit", lambda job: queued.append(job) or True)
+    c = TestClient(server.api)  # no lifespan: the pipeline isn't started, jobs are only captured
+    c.queued = queued
+    return c
+
+def test_ndjson_keeps_good_lines_and_rejects_bad_ones_by_index(client):
+    body = '{"message": "failed login from 1.2.3.4"}\n{not json\n\n{"message": "GET /admin", "rule": "probe"}\n'
+    r = client.post("/ingest/siem/bulk", content=body, headers={"content-type": "application/x-ndjson"})
+    assert r.status_code == 202
+    out = r.json()
+    assert out["accepted"] == 2
+    assert [x["index"] for x in out["rejected"]] == [1] and out["rejected"][0]["error"].startswith("invalid JSON")
+    assert client.queued == [{"texts": ["failed login from 1.2.3.4", "GET /admin"], "rules": [None, "probe"]}]
+
+def test_bulk_array_that_is_not_json_is_a_400(client):
+    r = client.post("/ingest/siem/bulk", content="[{", headers={"content-type": "application/json"})
+    assert r.status_code == 400 and client.queued == []
+
+def test_single_event_with_invalid_json_is_a_400(client):
+    r = client.post("/ingest/siem", content="{not json", headers={"content-type": "application/json"})
+    assert r.status_code == 400 and r.json()["error"].startswith("invalid JSON body")
+    assert client.queued == []
+
+def test_single_event_is_queued(client):
+    r = client.post("/ingest/siem", json={"message": "failed login from 1.2.3.4", "rule": "auth"})
+    assert r.status_code == 202
+    assert client.queued == [{"text": "failed login from 1.2.3.4", "rule": "auth"}]
@@ -0,0 +1,56 @@
+import random
+from collections import Counter
+
+from sketches import HyperLogLog, SpaceSaving
+
+def _stream(n_lines=20_000, n_ips=300, seed=7):
+    rng = random.Random(seed)
+    ips = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}" for _ in range(n_ips)]
+    return [rng.choice(ips) for _ in range(n_lines)]
+
+def test_top_is_exact_below_capacity():
+    items = _stream()
+    sk = SpaceSaving(1024)
+    for ip in items:
+        sk.add(ip)
+    truth = Counter(items)
+    assert sk.top(5) == sorted(truth.items(), key=lambda kv: (-kv[1], kv[0]))[:5]
+
+def test_top_never_overstates_when_full():
+    items = _stream()
+    sk = SpaceSaving(64)
+    for ip in items:
+        sk.add(ip)
+    truth = Counter(items)
+    for ip, n in sk.top(5):
+        assert n <= truth[ip]  # guaranteed counts are lower bounds
+    # an even spread leaves no item provably above the noise floor
+    assert all(n > sk._floor() for _, n in sk.top(5))
+
+def test_heavy_hitter_survives_small_sketch():
+    items = _stream() + ["9.9.9.9"] * 2000
+    random.Random(1).shuffle(items)
+    sk = SpaceSaving(64)
+    for ip in items:
+        sk.add(ip)
+    top_ip, n = sk.top(1)[0]
+    assert top_ip == "9.9.9.9" and n <= 2000
+
+def test_merge_matches_single_pass():
+    items = _stream()
+    whole, a, b = SpaceSaving(1024), SpaceSaving(1024), SpaceSaving(1024)
+    for ip in items:
+        whole.add(ip)
+    for ip in items[:7000]:
+        a.add(ip)
+    for ip in items[7000:]:
+        b.add(ip)
+    assert a.merge(b).top(5) == whole.top(5)
+
+def test_hyperloglog_estimate_and_merge():
+    a, b = HyperLogLog(), HyperLogLog()
+    for i in range(5000):
+        a.add(f"10.0.{i // 250}.{i % 250}")
+        b.add(f"10.1.{i // 250}.{i % 250}")
+    assert abs(a.count() - 5000) / 5000 < 0.05
+    assert abs(a.merge(b).count() - 10_000) / 10_000 < 0.05
@@ -0,0 +1,91 @@
+import os
+
+from tailer import LogTailer
+
+def _tailer(tmp_path, log):
+    return LogTailer([str(log)], checkpoint_path=str(tmp_path / "ck.json"), use_inotify=False)
+
+def _collect():
+    seen = []
+    return seen, lambda path, lines: seen.extend(lines)
+
+def test_existing_file_starts_at_eof_and_partial_lines_wait(tmp_path):
+    log = tmp_path / "app.log"
+    log.write_text("old 1\nold 2\n")
+    t = _tailer(tmp_path, log)
+    seen, handler = _collect()
+    t.poll_once(handler)
+    assert seen == []
+    with open(log, "a") as f:
+        f.write("new 1\nnew 2\npart")
+    t.poll_once(handler)
+    assert seen == ["new 1", "new 2"]
+    with open(log, "a") as f:
+        f.write("ial\n")
+    t.poll_once(handler)
+    assert seen == ["new 1", "new 2", "partial"]
+    t.stop()
+
+def test_rename_rotation_drains_old_file_then_follows_new(tmp_path):
+    log = tmp_path / "app.log"
+    log.write_text("")
+    t = _tailer(tmp_path, log)
+    seen, handler = _collect()
+    t.poll_once(handler)
+    with open(log, "a") as f:
+        f.write("before rotate\ntail without newline")
+    os.rename(log, tmp_path / "app.log.1")
+    log.write_text("after rotate\n")
+    t.poll_once(handler)
+    assert seen == ["before rotate", "tail without newline", "after rotate"]
+    t.stop()
+
+def test_truncation_rereads_from_start(tmp_path):
+    log = tmp_path / "app.log"
+    log.write_text("")
+    t = _tailer(tmp_path, log)
+    seen, handler = _collect()
+    t.poll_once(handler)
+    log.write_text("a long first line\n")
+    t.poll_once(handler)
+    log.write_text("short\n")  # same inode, smaller than our offset
+    t.poll_once(handler)
+    assert seen == ["a long first line", "short"]
+    t.stop()
+
+def test_restart_resumes_from_checkpoint_including_rotated_away_file(tmp_path):
+    log = tmp_path / "app.log"
+    log.write_text("")
+    t = _tailer(tmp_path, log)
+    seen, handler = _collect()
+    t.poll_once(handler)
+    with open(log, "a") as f:
+        f.write("one\n")
+    t.poll_once(handler)
+    t.stop()
+    # While we're down: more lines, then a rotation and a fresh file.
+    with open(log, "a") as f:
+        f.write("two\n")
+    os.rename(log, tmp_path / "app.log.1")
+    log.write_text("three\n")
+    t2 = _tailer(tmp_path, log)
+    t2.poll_once(handler)
+    assert seen == ["one", "two", "three"]
+    t2.stop()
+
+def test_failed_handler_redelivers_the_batch(tmp_path):
+    log = tmp_path / "app.log"
+    log.write_text("")
+    t = _tailer(tmp_path, log)
+    seen, handler = _collect()
+    t.poll_once(handler)
+    log.write_text("x\ny\n")
+    def boom(path, lines):
+        raise RuntimeError("downstream down")
+    try:
+        t.poll_once(boom)
+    except RuntimeError:
+        pass
+    t.poll_once(handler)
+    assert seen == ["x", "y"]
+    t.stop()
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from bench.synth import log_text
+from blockkit import triage_blocks
+from llm import _mock_result
+import triage
+from triage import IP_SKETCH_SIZE, parse_file, parse_log, summarize
+
+MIX = {"failed_login": 0.05, "sqli": 0.02, "server_error": 0.05, "prompt_injection": 0.01}
+
+@pytest.mark.parametrize("fmt", ["text", "nginx", "json", "syslog"])
+def test_parallel_parse_file_matches_sequential(tmp_path, fmt):
+    path = tmp_path / f"{fmt}.log"
+    path.write_text(log_text(lines=4000, fmt=fmt, ips=200, mix=MIX) + "\n")
+    sequential = parse_file(str(path), workers=1)
+    parallel = parse_file(str(path), workers=2, chunk_bytes=32 * 1024)  # several ranges, split mid-line
+    assert parallel == sequential
+    assert sequential["counts"] == parse_log(path.read_text())["counts"]
+    assert sum(sequential["counts"].values()) > 0
+
+def test_evenly_spread_sources_still_report_distinct_count():
+    n_ips = IP_SKETCH_SIZE * 8
+    text = "\n".join(f"failed login for admin from 10.{i // 65536}.{i // 256 % 256}.{i % 256}" for i in range(n_ips))
+    parsed = parse_log(text)
+    assert parsed["top_ips"] == [] and parsed["top_ip"] is None  # no IP provably above the noise floor
+    assert abs(parsed["distinct_ips"] - n_ips) < 0.05 * n_ips
+    assert f"distinct_ips={parsed['distinct_ips']}" in summarize(parsed) and "no_dominant_source" in summarize(parsed)
+    tr = _mock_result(summarize(parsed), "high", [])
+    sources = [b for b in triage_blocks(tr, parsed) if "Sources" in str(b)]
+    assert "no dominant source" in str(sources)
+
+def _console_login_failure(i):
+    return {"eventSource": "signin.amazonaws.com", "eventName": "ConsoleLogin",
+            "sourceIPAddress": f"192.0.2.{i % 50}", "userIdentity": {"arn": f"arn:aws:iam::1:user/u{i}"},
+            "responseElements": {"ConsoleLogin": "Failure"}}
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_cloudtrail_export_is_never_sharded(tmp_path, workers):
+    path = tmp_path / "export.json"
+    path.write_text(json.dumps({"Records": [_console_login_failure(i) for i in range(3000)]}, indent=2))
+    parsed = parse_file(str(path), workers=workers, chunk_bytes=64 * 1024)
+    assert parsed["format"] == "cloudtrail" and parsed["counts"]["failed_login"] == 3000
+
+def test_json_lines_starting_with_an_object_are_sharded_not_loaded_whole(tmp_path, monkeypatch):
+    path = tmp_path / "events.jsonl"
+    path.write_text("\n".join(json.dumps(_console_login_failure(i)) for i in range(3000)) + "\n")
+    monkeypatch.setattr("triage.parse_log", lambda *a, **k: pytest.fail("JSON lines read as one document"))
+    sequential = parse_file(str(path), workers=1)
+    assert parse_file(str(path), workers=2, chunk_bytes=64 * 1024) == sequential
+    assert sequential["format"] == "cloudtrail" and sequential["counts"]["failed_login"] == 3000
+
+def test_cli_prints_the_parse_as_json(tmp_path, capsys):
+    path = tmp_path / "nginx.log"
+    path.write_text(log_text(lines=2000, fmt="nginx", ips=50, mix=MIX) + "\n")
+    assert triage.main(["--workers", "2", "--chunk-bytes", str(32 * 1024), str(path)]) == 0
+    out = json.loads(capsys.readouterr().out)
+    assert out["counts"] == parse_file(str(path), workers=1)["counts"] and out["baseline"] in ("low", "medium", "high", "critical")
@@ -1,43 +1,273 @@
-import re
-from typing import Dict, List
-
-ANOMALY_PATTERNS = {
-    "failed_login": re.compile(r"failed login|authentication failed|invalid password", re.I),
-    "suspicious_path": re.compile(r"(/admin|/wp-login|/phpmyadmin|union select|\' or 1=1|--)", re.I),
-    "server_error": re.compile(r"\b(5\d{2})\b"),
-    "llm_prompt_injection": re.compile(r"ignore previous|disregard all|system prompt|leak data", re.I),
-}
+import heapq, io, itertools, json, os, re
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from typing import Callable, Dict, Iterable, List, Tuple
+from formats import FORMATS, SNIFF_LINES, Record, detect_format, split_document
+from sketches import HyperLogLog, SpaceSaving
 
 IP_RE = re.compile(r"(\d{1,3}\.){3}\d{1,3}")
 
-def parse_log(text: str) -> Dict:
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    counts = {k: 0 for k in ANOMALY_PATTERNS}
-    ips: List[str] = []
-    samples: List[str] = []
-
-    for ln in lines:
-        for k, rx in ANOMALY_PATTERNS.items():
-            if rx.search(ln):
-                counts[k] += 1
-                if len(samples) < 8:
-                    samples.append(ln[:240])
-        ip = IP_RE.search(ln)
+class ScanEngine:
+    """All anomaly patterns compiled into one alternation with a named group each.
+
+    A line is first lowercased and checked against a cheap prefilter built from
+    every pattern's hints (regex fragments, usually plain lowercase literals,
+    that must appear whenever the pattern can match). Lines that miss it, the
+    common case, only have their IP extracted. The rest go through a single
+    finditer over the combined regex, which yields pattern hits and the IP at once.
+    A pattern registered without hints disables the prefilter.
+
+    Structured records (see formats.py) go through ``scan_record``: patterns
+    only see the record's free-text fields, and a pattern's field rule, when it
+    returns True/False, overrides the text match (e.g. 5xx from the status field).
+    """
+
+    def __init__(self):
+        self.patterns: Dict[str, re.Pattern] = {}
+        self._hints: Dict[str, str | None] = {}
+        self._field_rules: Dict[str, Callable[[Record], bool | None]] = {}
+        self._compile()
+
+    def register(self, name: str, pattern: str | re.Pattern, hints: str | None = None) -> None:
+        if not name.isidentifier() or name.startswith("_"):
+            raise ValueError(f"invalid pattern name: {name!r}")
+        self.patterns[name] = pattern if isinstance(pattern, re.Pattern) else re.compile(pattern, re.I)
+        self._hints[name] = hints
+        self._compile()
+
+    def register_field_rule(self, name: str, rule: Callable[[Record], bool | None]) -> None:
+        """Decide pattern ``name`` from typed fields; return None to fall back to the text match."""
+        if name not in self.patterns:
+            raise ValueError(f"unknown pattern: {name!r}")
+        self._field_rules[name] = rule
+
+    def _compile(self) -> None:
+        parts = []
+        for name, rx in self.patterns.items():
+            src = f"(?i:{rx.pattern})" if rx.flags & re.I else rx.pattern
+            parts.append(f"(?P<{name}>{src})")
+        # IP last so anomaly patterns win when both could start at one position.
+        parts.append(f"(?P<_ip>{IP_RE.pattern})")
+        self._combined = re.compile("|".join(parts))
+        hints = list(self._hints.values())
+        self._prefilter = None if None in hints else re.compile("|".join(hints) or "(?!)")
+
+    def scan(self, line: str) -> Tuple[List[str], str | None]:
+        """Return (names of the patterns matching ``line``, first IP in ``line``)."""
+        if self._prefilter is not None and not self._prefilter.search(line.lower()):
+            m = IP_RE.search(line)
+            return [], (m.group(0) if m else None)
+        hits: List[str] = []
+        ip = None
+        for m in self._combined.finditer(line):
+            name = m.lastgroup
+            if name == "_ip":
+                if ip is None:
+                    ip = m.group(0)
+            elif name not in hits:
+                hits.append(name)
+        return hits, ip
+
+    def scan_record(self, rec: Record) -> Tuple[List[str], str | None]:
+        """scan() for a parsed record: text patterns on ``rec.text``, field rules on the rest."""
+        hits, ip = self.scan(rec.text) if rec.text else ([], None)
+        for name, rule in self._field_rules.items():
+            verdict = rule(rec)
+            if verdict and name not in hits:
+                hits.append(name)
+            elif verdict is False and name in hits:
+                hits.remove(name)
+        return hits, rec.ip or ip
+
+ENGINE = ScanEngine()
+ENGINE.register("failed_login", r"failed login|authentication failed|invalid password",
+                hints=r"login|authentication|password")
+ENGINE.register("suspicious_path", r"(/admin|/wp-login|/phpmyadmin|union select|\' or 1=1|--)",
+                hints=r"/admin|/wp-login|/phpmyadmin|union select|' or 1=1|--")
+ENGINE.register("server_error", re.compile(r"\b(5\d{2})\b"), hints=r"5\d\d\b")
+ENGINE.register("llm_prompt_injection", r"ignore previous|disregard all|system prompt|leak data",
+                hints=r"ignore previous|disregard all|system prompt|leak data")
+
+_LOGIN_EVENT = re.compile(r"login|logon|signin|sign_in|auth|sshd|sudo|\bsu\b", re.I)
+
+def _failed_login_field(rec: Record) -> bool | None:
+    if rec.outcome == "failure" and rec.event and _LOGIN_EVENT.search(rec.event):
+        return True
+    if rec.status == 401 and rec.method == "POST":
+        return True
+    return None
+
+def _server_error_field(rec: Record) -> bool | None:
+    return None if rec.status is None else 500 <= rec.status <= 599
+
+ENGINE.register_field_rule("failed_login", _failed_login_field)
+ENGINE.register_field_rule("server_error", _server_error_field)
+
+ANOMALY_PATTERNS = ENGINE.patterns
+
+MAX_SAMPLES = 8
+TOP_IPS = 5
+IP_SKETCH_SIZE = int(os.getenv("IP_SKETCH_SIZE", "1024"))
+PARALLEL_CHUNK_BYTES = int(os.getenv("PARALLEL_CHUNK_BYTES", str(32 * 1024 * 1024)))
+SNIFF_BYTES = 1 << 20  # longest first line read to tell a JSON document from JSON lines
+
+class LogStats:
+    """Mergeable partial parse result for a log or one shard of it.
+
+    Samples are keyed by (shard origin, line number) and only the smallest
+    MAX_SAMPLES keys are kept, so merging shards in any grouping reproduces
+    the first-come samples of a sequential parse. Source IPs go into fixed-size
+    sketches (Space-Saving for the heaviest hitters, HyperLogLog for the
+    distinct count), so memory does not grow with the log. merge() is associative.
+    """
+
+    def __init__(self, origin: int = 0):
+        self.origin = origin
+        self.line_count = 0
+        self.counts: Dict[str, int] = {k: 0 for k in ENGINE.patterns}
+        self.top_ips = SpaceSaving(IP_SKETCH_SIZE)
+        self.distinct_ips = HyperLogLog()
+        self.samples: List[Tuple[Tuple[int, int], str]] = []
+        self.fmt: str | None = None
+
+    def add(self, ln: str, hits: List[str], ip: str | None) -> None:
+        self.line_count += 1
+        for k in hits:
+            self.counts[k] = self.counts.get(k, 0) + 1
+        if hits and len(self.samples) < MAX_SAMPLES:
+            self.samples.append(((self.origin, self.line_count), ln[:240]))
         if ip:
-            ips.append(ip.group(0))
+            if ip not in self.top_ips.counts:
+                self.distinct_ips.add(ip)  # tracked IPs are already in the HLL
+            self.top_ips.add(ip)
+
+    def merge(self, other: "LogStats") -> "LogStats":
+        """Fold ``other`` into this accumulator and return it."""
+        self.line_count += other.line_count
+        for k, v in other.counts.items():
+            self.counts[k] = self.counts.get(k, 0) + v
+        self.top_ips.merge(other.top_ips)
+        self.distinct_ips.merge(other.distinct_ips)
+        self.samples = heapq.nsmallest(MAX_SAMPLES, self.samples + other.samples)
+        self.origin = min(self.origin, other.origin)
+        self.fmt = self.fmt or other.fmt
+        return self
+
+    def result(self) -> Dict:
+        top_ips = self.top_ips.top(TOP_IPS)
+        return {
+            "line_count": self.line_count,
+            "counts": dict(self.counts),
+            "top_ip": top_ips[0][0] if top_ips else None,
+            "top_ips": top_ips,
+            "distinct_ips": self.distinct_ips.count(),  # even when no single source stands out
+            "samples": [ln for _, ln in self.samples],
+            "format": self.fmt or "text",
+        }
+
+def _feed(stats: LogStats, lines: Iterable[str | bytes], engine: "ScanEngine", fmt: str | None = None) -> LogStats:
+    parse = FORMATS[fmt].parse if fmt else None
+    stats.fmt = stats.fmt or fmt
+    for raw in lines:
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8", errors="replace")
+        ln = raw.strip()
+        if not ln:
+            continue
+        rec = parse(ln) if parse else None
+        stats.add(ln, *(engine.scan_record(rec) if rec is not None else engine.scan(ln)))
+    return stats
+
+def _decoded(lines: Iterable[str | bytes]) -> Iterable[str]:
+    for raw in lines:
+        yield raw.decode("utf-8", errors="replace") if isinstance(raw, bytes) else raw
+
+def sniff(lines: Iterable[str | bytes]) -> Tuple[str | None, Iterable[str | bytes]]:
+    """Detect the format from the first lines; returns it with an iterator that still yields every line."""
+    it = iter(lines)
+    head = list(itertools.islice(it, SNIFF_LINES))
+    return detect_format(_decoded(head)), itertools.chain(head, it)
 
-    top_ip = None
-    if ips:
-        from collections import Counter
-        c = Counter(ips)
-        top_ip, _ = c.most_common(1)[0]
+def parse_stream(lines: Iterable[str | bytes], fmt: str | None = None) -> Dict:
+    """Streaming parse_log: consume lines one at a time with bounded memory.
 
-    return {
-        "line_count": len(lines),
-        "counts": counts,
-        "top_ip": top_ip,
-        "samples": samples,
-    }
+    Accepts any iterable of str or bytes lines, including a binary file object
+    or ``requests.Response.iter_lines()``. Returns the same shape as parse_log.
+    The format is sniffed from the first lines unless ``fmt`` is given.
+    """
+    if fmt is None:
+        fmt, lines = sniff(lines)
+    return _feed(LogStats(), lines, ENGINE, fmt).result()
+
+def parse_log(text: str, fmt: str | None = None) -> Dict:
+    records = split_document(text) if fmt in (None, "cloudtrail", "json") else None
+    if records is not None:
+        return parse_stream(records, fmt)
+    return parse_stream(io.StringIO(text), fmt)
+
+def _parse_range(path: str, start: int, end: int, engine: ScanEngine, fmt: str | None = None) -> LogStats:
+    """Parse the lines of ``path`` that start inside the byte range [start, end)."""
+    stats = LogStats(origin=start)
+    with open(path, "rb") as f:
+        if start:
+            f.seek(start - 1)
+            f.readline()  # finish the line straddling ``start`` (no-op if it ends right there)
+        pos = f.tell()
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            _feed(stats, (line,), engine, fmt)
+    return stats
+
+def _is_json_document(path: str) -> bool:
+    """True if ``path`` holds one JSON document (e.g. a CloudTrail export), not JSON lines or text.
+
+    Only the first non-blank line is read: a JSON-lines file starts with a complete
+    object per line, while a document opens an array, spreads over several lines,
+    or is a single ``{"Records": [...]}`` object.
+    """
+    with open(path, "rb") as f:
+        head = b""
+        while not head:
+            line = f.readline(SNIFF_BYTES)
+            if not line:
+                return False
+            head = line.strip()
+    if head[:1] == b"[":
+        return True
+    if head[:1] != b"{":
+        return False
+    try:
+        obj = json.loads(head)
+    except ValueError:
+        return True  # an object continued on later lines (or longer than SNIFF_BYTES)
+    return isinstance(obj, dict) and isinstance(obj.get("Records"), list)
+
+def parse_file(path: str, workers: int | None = None, chunk_bytes: int = PARALLEL_CHUNK_BYTES) -> Dict:
+    """parse_log for a file on disk, split into line-aligned byte ranges across a process pool.
+
+    Small files (a single chunk) or ``workers=1`` are parsed in-process. A single
+    JSON document can't be split at line boundaries, so it is always parsed
+    whole; JSON lines stream or shard like any other log. This is the entry
+    point for large local dumps (also ``python -m triage --workers N file``);
+    the Slack and HTTP paths stream through parse_stream instead of forking
+    from a threaded server.
+    """
+    if _is_json_document(path):
+        with open(path, "rb") as f:
+            return parse_log(f.read().decode("utf-8", errors="replace"))
+    size = os.path.getsize(path)
+    if workers == 1 or size <= chunk_bytes:
+        with open(path, "rb") as f:
+            return parse_stream(f)
+    with open(path, "rb") as f:
+        fmt, _ = sniff(itertools.islice(f, SNIFF_LINES))
+    ranges = [(s, min(s + chunk_bytes, size)) for s in range(0, size, chunk_bytes)]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        parts = ex.map(_parse_range, *zip(*[(path, s, e, ENGINE, fmt) for s, e in ranges]))
+        return reduce(LogStats.merge, parts).result()
 
 def baseline_severity(parsed: Dict) -> str:
     c = parsed["counts"]
@@ -65,4 +295,24 @@ def summarize(parsed: Dict) -> str:
         bits.append(f"llm_injection_signals={c['llm_prompt_injection']}")
     if parsed.get("top_ip"):
         bits.append(f"top_ip={parsed['top_ip']}")
+    if parsed.get("distinct_ips", 0) > 1:
+        bits.append(f"distinct_ips={parsed['distinct_ips']}")
+        if parsed.get("top_ips"):
+            bits.append("top_ips=" + " ".join(f"{ip}({n})" for ip, n in parsed["top_ips"]))
+        else:
+            bits.append("no_dominant_source")
     return ", ".join(bits) or "no obvious anomalies"
+
+def main(argv: List[str] | None = None) -> int:
+    import argparse
+    ap = argparse.ArgumentParser(description="Parse a large log file across worker processes and print the result as JSON.")
+    ap.add_argument("path")
+    ap.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU; 1 parses in-process)")
+    ap.add_argument("--chunk-bytes", type=int, default=PARALLEL_CHUNK_BYTES, help="bytes per parallel range")
+    a = ap.parse_args(argv)
+    parsed = parse_file(a.path, workers=a.workers, chunk_bytes=a.chunk_bytes)
+    print(json.dumps({**parsed, "baseline": baseline_severity(parsed), "summary": summarize(parsed)}, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
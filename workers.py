@@ -0,0 +1,77 @@
+# workers.py — bounded job queue drained by a pool of worker threads
+import queue, threading
+from typing import Any, Callable, Dict
+
+class WorkQueue:
+    """Fixed pool of daemon threads running ``handler(job)`` for each submitted job.
+
+    submit() never blocks: it returns False when the queue is full so callers
+    can shed load (e.g. answer 429) instead of stalling.
+    """
+
+    def __init__(self, handler: Callable[[Any], None], workers: int = 4, maxsize: int = 1000, name: str = "triageo-worker"):
+        self.handler = handler
+        self.workers = workers
+        self.name = name
+        self._q: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self.processed = self.failed = self.rejected = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        """Let queued jobs finish, then stop the workers."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._q.put(None)
+        for t in threads:
+            t.join(timeout)
+
+    def submit(self, job: Any) -> bool:
+        try:
+            self._q.put_nowait(job)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+
+    @property
+    def depth(self) -> int:
+        return self._q.qsize()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "depth": self.depth,
+            "capacity": self._q.maxsize,
+            "workers": len(self._threads),
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    def _run(self) -> None:
+        while True:
+            job = self._q.get()
+            if job is None:
+                return
+            try:
+                self.handler(job)
+                ok = True
+            except Exception as e:
+                print(f"⚠️ {self.name} job failed:", repr(e))
+                ok = False
+            with self._lock:
+                if ok:
+                    self.processed += 1
+                else:
+                    self.failed += 1